@@ -76,6 +76,7 @@ def load_report(report_id: str):
     CLEANER.start()
     report = logs_main.THE_LOGS(report_id)
     OPENED_LOGS[report_id] = report
+    CLEANER.wake()
     add_log_entry(ip, "OPENNED", report_id)
 
     report.last_access = now
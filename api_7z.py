@@ -279,17 +279,24 @@ class SevenZipArchive(SevenZipArchiveInfo):
             self.archive_path.unlink()
         return self.append(file_path, custom_mode)
 
-    def read_file_into_stdout(self, file_line: SevenZipLine):
+    def open_file_stdout(self, file_line: SevenZipLine):
         file_name = file_line.file_name
         if "*" in file_name:
             file_name = f'"{file_name}"'
         cmd_list = [self.path, 'e', self.archive_path, "-so", "--", file_name]
         self._7z_pipe = subprocess.Popen(cmd_list, stdout=subprocess.PIPE)
-        stdout = self._7z_pipe.stdout
+        return self._7z_pipe.stdout
+
+    def read_file_into_stdout(self, file_line: SevenZipLine):
+        stdout = self.open_file_stdout(file_line)
+        yield from read_lines(stdout)
+
+
+def read_lines(stdout):
+    line = stdout.readline(5000)
+    while line:
+        yield line
         line = stdout.readline(5000)
-        while line:
-            yield line
-            line = stdout.readline(5000)
 
 
 def _test1():
@@ -0,0 +1,141 @@
+'''
+Disk cache of report slices results, 2nd level after report's CACHE.
+Survives reports removed from memory and server restarts, shared by all workers.
+
+key   - report id, report version, function name, args, slice
+value - pickled and compressed result
+Least recently used results are removed when cache is bigger than max size.
+Reads don't write, last access is updated only when it's older than TOUCH_INTERVAL.
+'''
+
+import io
+import pickle
+import sqlite3
+from collections import defaultdict
+from contextlib import closing
+from copy import deepcopy
+from functools import partial
+from time import time
+
+import zstd
+
+from c_path import Directories, PathExt
+from h_debug import Loggers
+
+LOGGER_REPORTS = Loggers.reports
+
+SLICES_CACHE_PATH = Directories.db / "slices_cache.db"
+SLICES_CACHE_MAX_BYTES = 2 * 2**30
+SLICES_CACHE_SHRINK_TO = 0.9
+EVICT_EVERY_SAVES = 100
+# seconds, precise enough for eviction order, cache hits don't wait for write lock
+TOUCH_INTERVAL = 5 * 60
+QUERIES_CREATE = (
+    "PRAGMA journal_mode=WAL",
+    "CREATE TABLE IF NOT EXISTS [slices] (key PRIMARY KEY, value BLOB, size INTEGER, last_access REAL) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS [idx.slices.last_access] ON [slices] (last_access)",
+)
+QUERY_EVICT = '''
+DELETE FROM [slices] WHERE key IN (
+    SELECT key FROM (
+        SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS total FROM [slices]
+    ) WHERE total > ?
+)
+'''
+
+
+def is_local_function(func):
+    qualname = getattr(func, "__qualname__", "")
+    return "<lambda>" in qualname or "<locals>" in qualname
+
+
+class SlicesPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        # defaultdict(lambda: defaultdict(int)) is everywhere in results
+        # lambda is replaced with a copy of its default value
+        if type(obj) is defaultdict and is_local_function(obj.default_factory):
+            factory = partial(deepcopy, obj.default_factory())
+            return defaultdict, (factory, ), None, None, iter(obj.items())
+        return NotImplemented
+
+
+def serialize(value) -> bytes:
+    f = io.BytesIO()
+    SlicesPickler(f, pickle.HIGHEST_PROTOCOL).dump(value)
+    return zstd.compress(f.getvalue(), 3)
+
+def deserialize(data: bytes):
+    return pickle.loads(zstd.decompress(data))
+
+
+class SlicesCache:
+    def __init__(self, path: PathExt=SLICES_CACHE_PATH, max_bytes: int=SLICES_CACHE_MAX_BYTES) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.tables_created = False
+        self.saves = 0
+
+    def connect(self):
+        # new connection every time, reports are used in different threads
+        connection = sqlite3.connect(self.path, timeout=5)
+        if not self.tables_created:
+            with connection as c:
+                for query in QUERIES_CREATE:
+                    c.execute(query)
+            self.tables_created = True
+        return closing(connection)
+
+    def load(self, key: str):
+        '''Raises KeyError if key is not cached'''
+        try:
+            with self.connect() as connection:
+                row = connection.execute("SELECT value, last_access FROM [slices] WHERE key=?", (key, )).fetchone()
+                if row and row[1] < time() - TOUCH_INTERVAL:
+                    self.touch(connection, key)
+        except sqlite3.Error:
+            LOGGER_REPORTS.exception(f"SlicesCache.load | {key}")
+            row = None
+
+        if not row:
+            raise KeyError(key)
+        return deserialize(row[0])
+
+    def touch(self, connection: sqlite3.Connection, key: str):
+        # value is already read, busy database only delays eviction order
+        try:
+            with connection as c:
+                c.execute("UPDATE [slices] SET last_access=? WHERE key=?", (time(), key))
+        except sqlite3.OperationalError:
+            pass
+
+    def save(self, key: str, value):
+        try:
+            data = serialize(value)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # local classes or functions in results, can't be cached
+            return
+
+        try:
+            with self.connect() as connection:
+                with connection as c:
+                    c.execute("REPLACE INTO [slices] VALUES(?,?,?,?)", (key, data, len(data), time()))
+        except sqlite3.Error:
+            LOGGER_REPORTS.exception(f"SlicesCache.save | {key}")
+            return
+
+        self.saves += 1
+        if self.saves % EVICT_EVERY_SAVES == 0:
+            self.evict()
+
+    def evict(self):
+        try:
+            with self.connect() as connection:
+                with connection as c:
+                    total = c.execute("SELECT SUM(size) FROM [slices]").fetchone()[0] or 0
+                    if total > self.max_bytes:
+                        c.execute(QUERY_EVICT, (int(self.max_bytes * SLICES_CACHE_SHRINK_TO), ))
+        except sqlite3.Error:
+            LOGGER_REPORTS.exception("SlicesCache.evict")
+
+
+SLICES_CACHE = SlicesCache()
@@ -0,0 +1,98 @@
+'''
+Index of processed uploads.
+archives - archive file hash -> upload info file
+slices   - slice content hash -> raid id
+heads    - hash of the start of a logs text file -> upload info file
+'''
+
+import hashlib
+import sqlite3
+from contextlib import closing
+
+from c_path import Directories, PathExt
+
+UPLOADS_DB_PATH = Directories.db / "uploads.db"
+HASH_CHUNK_SIZE = 2**20
+QUERIES_CREATE = (
+    "CREATE TABLE IF NOT EXISTS [archives] (hash PRIMARY KEY, info_path) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS [slices] (hash PRIMARY KEY, raid_id) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS [idx.slices.raid_id] ON [slices] (raid_id)",
+    "CREATE TABLE IF NOT EXISTS [heads] (hash PRIMARY KEY, info_path) WITHOUT ROWID",
+)
+
+
+def new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+def file_hash(path: PathExt):
+    h = new_hash()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def lines_hash(lines: list[bytes]):
+    h = new_hash()
+    for line in lines:
+        h.update(line)
+    return h.hexdigest()
+
+
+class UploadsDB:
+    def __init__(self, path: PathExt=UPLOADS_DB_PATH) -> None:
+        self.path = path
+        self.tables_created = False
+
+    def connect(self):
+        # new connection every time, uploads are processed in different threads
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self.tables_created:
+            with connection as c:
+                for query in QUERIES_CREATE:
+                    c.execute(query)
+            self.tables_created = True
+        return closing(connection)
+
+    def _fetch_one(self, query: str, *args):
+        with self.connect() as connection:
+            row = connection.execute(query, args).fetchone()
+        return row[0] if row else None
+
+    def _replace_rows(self, table_name: str, rows: list[tuple]):
+        with self.connect() as connection:
+            with connection as c:
+                c.executemany(f"REPLACE INTO [{table_name}] VALUES(?,?)", rows)
+
+    def _info_path(self, table_name: str, _hash: str):
+        info_path = self._fetch_one(f"SELECT info_path FROM [{table_name}] WHERE hash=?", _hash)
+        if not info_path:
+            return None
+        info_path = PathExt(info_path)
+        if not info_path.is_file():
+            return None
+        return info_path
+
+    def archive_info_path(self, archive_hash: str):
+        return self._info_path("archives", archive_hash)
+
+    def head_info_path(self, head_hash: str):
+        return self._info_path("heads", head_hash)
+
+    def add_archive(self, archive_hash: str, info_path: PathExt):
+        self._replace_rows("archives", [(archive_hash, str(info_path))])
+
+    def slice_raid_id(self, slice_hash: str) -> str:
+        return self._fetch_one("SELECT raid_id FROM [slices] WHERE hash=?", slice_hash)
+
+    def raid_is_known(self, raid_id: str):
+        return self._fetch_one("SELECT 1 FROM [slices] WHERE raid_id=?", raid_id) is not None
+
+    def add_slices(self, slices: dict[str, str]):
+        '''slices - slice hash: raid id'''
+        self._replace_rows("slices", list(slices.items()))
+
+    def add_heads(self, heads: list[str], info_path: PathExt):
+        self._replace_rows("heads", [(head_hash, str(info_path)) for head_hash in heads])
+
+
+UPLOADS_DB = UploadsDB()
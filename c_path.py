@@ -1,8 +1,11 @@
 import json
+import os
 import shutil
+import threading
 from enum import Enum
 from pathlib import Path
 
+import numpy
 import zstd
 
 class StrEnum(str, Enum):
@@ -22,6 +25,7 @@ class DirNames(StrEnum):
     certificates = "__cert"
     
     temp = "temp"
+    cache = "cache"
     
     db = "db"
     top = "top"
@@ -48,6 +52,7 @@ class FileNames(StrEnum):
 
     logs_cut = "LOGS_CUT.zstd"
     logs_cut_old = "LOGS_CUT.zlib"
+    report_index = "REPORT_INDEX.bin"
     logs_top = "top.json"
 
 
@@ -147,6 +152,18 @@ class _PathExtFiles(_PathExt):
     def text_lines(self):
         return self.read_text().splitlines()
 
+    @property
+    def temp_path(self):
+        '''unique file next to self for this process and thread, os.replace self with it when it's written'''
+        return self.with_name(f"{self.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def npy_write(self, data: numpy.ndarray):
+        '''other processes might have self memory-mapped, file is replaced instead of written over'''
+        temp_path = self.temp_path
+        with open(temp_path, "wb") as f:
+            numpy.save(f, data)
+        os.replace(temp_path, self)
+
     def zstd_write(self, data: bytes, compress_level=3):
         data = zstd.compress(data, compress_level)
         self.write_bytes(data)
@@ -220,6 +237,7 @@ class Directories(dict[str, PathExt]):
     certificates = main / DirNames.certificates
 
     temp = main / DirNames.temp
+    cache = main / DirNames.cache
 
     db = main / DirNames.db
     top = db / DirNames.top
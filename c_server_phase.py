@@ -28,6 +28,12 @@ class Encounter:
         return f"""
         SELECT {Columns.SPEC}, {Columns.USEFUL_DPS}
         FROM [{self.table_name}]
+        ORDER BY {Columns.SPEC}, {Columns.USEFUL_DPS}
+        """
+    def query_stats_signature(self):
+        return f"""
+        SELECT COUNT(*), TOTAL({Columns.USEFUL_DPS})
+        FROM [{self.table_name}]
         """
     def query_dps_spec(self, spec):
         return f"""
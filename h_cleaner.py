@@ -1,14 +1,22 @@
 import threading
 from datetime import datetime, timedelta
-from time import perf_counter, sleep
+from time import perf_counter
 
 import psutil
 
+import logs_lines
 from h_debug import Loggers
 
 LOGGER_MEMORY = Loggers.memory
 
 MAX_SURVIVE_LOGS = timedelta(minutes=30)
+CLEANER_INTERVAL = 10
+# memory of all opened reports in this process: logs + loaded data + cached results
+# memory mapped files are shared by all workers and aren't counted,
+# shared decompressed logs have their own cap: logs_lines.SHARED_CACHE_MAX_BYTES
+MEMORY_BUDGET = 4 * 2**30
+MAX_MEMORY_PERCENT = 75
+MB = 1024 * 1024
 
 def add_log_entry_memory(msg):
     _m = psutil.virtual_memory()
@@ -18,21 +26,92 @@ def add_log_entry_memory(msg):
 
 
 class MemoryCleaner(threading.Thread):
-    def __init__(self, OPENED_LOGS):
+    def __init__(self, OPENED_LOGS, memory_budget: int=MEMORY_BUDGET):
         super().__init__(daemon=True)
         self.OPENED_LOGS = OPENED_LOGS
-        
+        self.memory_budget = memory_budget
+        self.usage: dict[str, dict[str, int]] = {}
+        # decompressed logs in shared memory, all workers
+        self.usage_shared = 0
+        self.wake_event = threading.Event()
+
+    @property
+    def usage_total(self):
+        return sum(sum(report_usage.values()) for report_usage in self.usage.values())
+
+    def update_usage(self):
+        self.usage = {
+            report_id: self.OPENED_LOGS[report_id].memory_usage()
+            for report_id in list(self.OPENED_LOGS)
+        }
+        return self.usage_total
+
+    def remove_report(self, report_id: str, reason: str):
+        report_usage = self.usage.pop(report_id, None) or {}
+        self.OPENED_LOGS.pop(report_id, None)
+        add_log_entry_memory(f"{reason} | {report_id} | {sum(report_usage.values()) / MB:,.1f}MB")
+
+    def remove_old_reports(self):
+        now = datetime.now()
+        for report_id in list(self.OPENED_LOGS):
+            if now - self.OPENED_LOGS[report_id].last_access > MAX_SURVIVE_LOGS:
+                self.remove_report(report_id, "NUKED OLD")
+
+    def drop_cached_slices(self, to_free: int):
+        '''Drops least recently used cached results of all reports.'''
+        cached_slices = [
+            (cached.last_access, cached.size, report_id, cache_key)
+            for report_id, report in list(self.OPENED_LOGS.items())
+            for cache_key, cached in list(report.CACHE_SIZES.items())
+        ]
+        cached_slices.sort(key=lambda x: x[0])
+
+        freed = 0
+        for _, size, report_id, cache_key in cached_slices:
+            if freed >= to_free:
+                break
+            self.OPENED_LOGS[report_id].drop_cached(cache_key)
+            freed += size
+
+        if freed:
+            add_log_entry_memory(f"Dropped cached slices | {freed / MB:,.1f}MB")
+        return freed
+
+    def reports_to_remove(self):
+        '''Least recently used first, reports bigger than their share of the budget go before others.'''
+        fair_share = self.memory_budget / max(len(self.usage), 1)
+        def sort_key(report_id: str):
+            is_small = sum(self.usage[report_id].values()) <= fair_share
+            return is_small, self.OPENED_LOGS[report_id].last_access
+
+        return sorted(self.usage, key=sort_key)
+
+    def fit_in_budget(self):
+        total = self.update_usage()
+        if total <= self.memory_budget:
+            return
+
+        self.drop_cached_slices(total - self.memory_budget)
+        total = self.update_usage()
+        if total <= self.memory_budget:
+            return
+
+        for report_id in self.reports_to_remove():
+            total -= sum(self.usage[report_id].values())
+            self.remove_report(report_id, "OVER BUDGET")
+            if total <= self.memory_budget:
+                break
+
     def cleaner(self):
         add_log_entry_memory(f"MemoryCleaner started | Openned {len(self.OPENED_LOGS)}")
         pc1 = perf_counter()
 
-        now = datetime.now()
-        reports = list(self.OPENED_LOGS)
-        for report_id in reports:
-            report = self.OPENED_LOGS[report_id]
-            if now - report.last_access > MAX_SURVIVE_LOGS:
-                del self.OPENED_LOGS[report_id]
-                add_log_entry_memory(f"NUKED OLD | {report_id}")
+        self.remove_old_reports()
+
+        try:
+            self.fit_in_budget()
+        except Exception:
+            LOGGER_MEMORY.exception("fit_in_budget")
 
         try:
             reports = sorted(self.OPENED_LOGS, key=lambda x: self.OPENED_LOGS[x].last_access)
@@ -41,11 +120,22 @@ class MemoryCleaner(threading.Thread):
             LOGGER_MEMORY.exception("sorted")
 
         for report_id in reports:
-            if psutil.virtual_memory().percent < 75:
+            if psutil.virtual_memory().percent < MAX_MEMORY_PERCENT:
                 break
-            del self.OPENED_LOGS[report_id]
-        
-        add_log_entry_memory(f'{(perf_counter() - pc1)*1000:>10,.3f}ms | MemoryCleaner done')
+            self.remove_report(report_id, "LOW MEMORY")
+
+        try:
+            logs_lines.remove_old_cache(MAX_SURVIVE_LOGS.total_seconds() * 2)
+            self.usage_shared = logs_lines.cache_size()
+        except Exception:
+            LOGGER_MEMORY.exception("remove_old_cache")
+
+        self.update_usage()
+        add_log_entry_memory(f'{(perf_counter() - pc1)*1000:>10,.3f}ms | MemoryCleaner done | Used {self.usage_total / MB:,.1f}MB | Shared logs {self.usage_shared / MB:,.1f}MB')
+
+    def wake(self):
+        '''Runs cleaner now instead of waiting for the interval, e.g. after new report is opened.'''
+        self.wake_event.set()
 
     def start(self):
         if self.is_alive():
@@ -57,7 +147,8 @@ class MemoryCleaner(threading.Thread):
 
     def run(self):
         while True:
-            sleep(10)
+            self.wake_event.wait(CLEANER_INTERVAL)
+            self.wake_event.clear()
             try:
                 self.cleaner()
             except Exception:
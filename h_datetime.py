@@ -1,5 +1,7 @@
 import re
+from calendar import isleap
 from datetime import datetime, timedelta
+from itertools import accumulate
 
 MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
 
@@ -111,6 +113,31 @@ def to_dt_bytes_year_fix(s, year: int=None):
         dt = dt.replace(year=year-1)
     return dt
 
+def days_before_month(year: int):
+    days = [0, 31, 28 + isleap(year), 31, 30, 31, 30, 31, 31, 30, 31, 30]
+    return list(accumulate(days))
+
+def to_ms_closure(year: int=None):
+    '''"6/25 21:46:32.302,..." or b"6/25 21:46:32.302  ..." -> milliseconds from the start of the year'''
+    if year is None:
+        year = get_now().year
+    DAYS = days_before_month(year)
+
+    def inner(s):
+        if isinstance(s, bytes):
+            i = s.index(b'.', 0, 20)
+            month, day = map(int, s[:i-9].split(b'/'))
+        else:
+            i = s.index('.', 0, 20)
+            month, day = map(int, s[:i-9].split('/'))
+        if not 0 < month < 13 or not 0 < day < 32:
+            raise ValueError("Bad date")
+        days = DAYS[month-1] + day - 1
+        seconds = int(s[i-8:i-6]) * 3600 + int(s[i-5:i-3]) * 60 + int(s[i-2:i])
+        return (days * 86400 + seconds) * 1000 + int(s[i+1:i+4])
+
+    return inner
+
 def duration_to_string(t: float):
     milliseconds = t % 1 * 1000
     if milliseconds < 1:
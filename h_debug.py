@@ -1,4 +1,5 @@
 import logging
+from functools import wraps
 from time import perf_counter
 
 from c_path import Directories
@@ -51,6 +52,7 @@ def get_ms_str(timestamp):
 
 def running_time(f):
     _logger = Loggers.reports
+    @wraps(f)
     def running_time_inner(*args, **kwargs):
         timestamp = perf_counter()
         q = f(*args, **kwargs)
@@ -0,0 +1,83 @@
+'''
+Seekable zstd: file is a sequence of independent frames, which can be decompressed as a whole.
+Frames index is saved next to the file:
+lines   - first line of every frame + total lines
+offsets - first byte of every frame + total bytes
+'''
+
+import os
+from bisect import bisect_right
+
+import zstd
+
+from c_path import PathExt
+
+FRAME_MAX_LINES = 50_000
+FRAMES_INDEX_SUFFIX = ".frames.json"
+
+
+def frames_index_path(path: PathExt):
+    return path.with_name(f"{path.name}{FRAMES_INDEX_SUFFIX}")
+
+def compress_frames(lines, index: dict[str, list[int]], boundaries: list[int]=None, max_lines: int=FRAME_MAX_LINES, compress_level: int=3):
+    '''Yields compressed frames, new frame starts on every boundary line and every max_lines lines.'''
+    boundaries = sorted(set(boundaries or []))
+    boundary_i = 0
+    index_lines = index["lines"] = [0]
+    index_offsets = index["offsets"] = [0]
+    line_n = 0
+    frame: list[bytes] = []
+
+    def new_frame():
+        data = zstd.compress(b"".join(frame), compress_level)
+        index_lines.append(line_n)
+        index_offsets.append(index_offsets[-1] + len(data))
+        frame.clear()
+        return data
+
+    for line in lines:
+        while boundary_i < len(boundaries) and boundaries[boundary_i] < line_n:
+            boundary_i += 1
+
+        if frame:
+            is_boundary = boundary_i < len(boundaries) and boundaries[boundary_i] == line_n
+            if is_boundary or len(frame) >= max_lines:
+                yield new_frame()
+
+        frame.append(line + b"\n")
+        line_n += 1
+
+    if frame:
+        yield new_frame()
+
+def write_frames(path: PathExt, lines, boundaries: list[int]=None):
+    '''Every line is kept, empty ones too, line numbers are the same as in lines.
+    Both files are written under temp names first, readers check that index matches the file size.'''
+    index = {}
+    temp_path = path.temp_path
+    with open(temp_path, "wb") as f:
+        for data in compress_frames(lines, index, boundaries):
+            f.write(data)
+    index_path = frames_index_path(path)
+    index_temp_path = index_path.temp_path
+    index_temp_path.json_write(index)
+    os.replace(temp_path, path)
+    os.replace(index_temp_path, index_path)
+    return index
+
+def read_frames_index(path: PathExt) -> dict[str, list[int]]:
+    '''Raises ValueError if file has no frames index or it doesn't match the file.'''
+    index = frames_index_path(path).json_ignore_error()
+    if not index or index["offsets"][-1] != path.stat().st_size:
+        raise ValueError("No frames index")
+    return index
+
+def frames_in_range(index_lines: list[int], s: int, f: int):
+    '''Frames numbers that have lines [s, f)'''
+    first = max(bisect_right(index_lines, s) - 1, 0)
+    last = bisect_right(index_lines, f - 1)
+    return range(first, min(last, len(index_lines) - 1))
+
+def decompress_frame(data, index: dict[str, list[int]], frame_n: int) -> bytes:
+    offsets = index["offsets"]
+    return zstd.decompress(data[offsets[frame_n]:offsets[frame_n+1]])
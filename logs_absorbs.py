@@ -1,11 +1,24 @@
+import json
+import os
+import shutil
+from bisect import bisect_left
 from collections import defaultdict
 
+import numpy
+
 import logs_base
 from h_datetime import get_delta_simple_precise
 from h_debug import running_time
+from logs_events import IdsTable
+from logs_prefix_sums import UnitsPrefixSums
 
 # THIS IS A FUCKING DISASTER
 
+ABSORBS_DIR_NAME = "ABSORBS"
+ABSORBS_KEYS_FILE_NAME = "keys.json"
+ABSORBS_SUMS_NAME = "absorbs"
+ABSORBS_DETAILS_DIR_NAME = "DETAILS"
+
 DAEGIS = "47753"
 VALANYR = "64413"
 HEAL_FLAGS = {
@@ -320,25 +333,25 @@ SHILD_IDS |= set(MAGE_FROST_WARD) | set(MAGE_FIRE_WARD) | set(MAGE_ICE_BARRIER)
 SHILD_IDS |= set(WARLOCK_SHADOW_WARD) | set(WARLOCK_SACRIFICE)
 
 @running_time
-def parse_absorb_related(logs: list[str], discos: set[str]=None):
+def parse_absorb_related(logs: list[str], discos: set[str]=None, first_row: int=0):
     if discos is None:
         discos = set()
     valanyrs = set()
     events = defaultdict(list)
-    for line in logs:
+    for row, line in enumerate(logs, first_row):
         try:
             timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, *etc = line.split(',')
             if flag == "DAMAGE_SPLIT":
                 if spell_id == "25228":
-                    events[source_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[1], 0, 0, etc[0]))
+                    events[source_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[1], 0, 0, etc[0], row))
                 else:
-                    events[source_guid].append((timestamp, flag, target_guid, target_name, source_guid, source_name, spell_id, spell_name, etc[1], 0, 0, etc[0]))
+                    events[source_guid].append((timestamp, flag, target_guid, target_name, source_guid, source_name, spell_id, spell_name, etc[1], 0, 0, etc[0], row))
             elif flag in HEAL_FLAGS:
                 if source_guid in valanyrs:
                     if spell_id not in VALANYR_IGNORED:
-                        events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[1], 0, 0, 0))
+                        events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[1], 0, 0, 0, row))
                 elif source_guid in discos and etc[-1] == "1":
-                    events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[1], 0, 0, 0))
+                    events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[1], 0, 0, 0, row))
             elif spell_id == "64411":
                 valanyrs.add(target_guid)
                 if flag == "SPELL_AURA_REMOVED":
@@ -346,14 +359,14 @@ def parse_absorb_related(logs: list[str], discos: set[str]=None):
             elif spell_id in SHILD_IDS:
                 if flag == "SPELL_CAST_SUCCESS":
                     continue
-                events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, 0, 0, 0, 0))
+                events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, 0, 0, 0, 0, row))
             else:
                 try:
                     if flag in MISSED:
                         if etc[-2] == "ABSORB":
-                            events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[-1], etc[-2], 0, etc[0]))
+                            events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[-1], etc[-2], 0, etc[0], row))
                     elif etc[6] != "0":
-                        events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[6], etc[1], etc[4], etc[0]))
+                        events[target_guid].append((timestamp, flag, source_guid, source_name, target_guid, target_name, spell_id, spell_name, etc[6], etc[1], etc[4], etc[0], row))
                 except IndexError:
                     continue
         except ValueError:
@@ -402,7 +415,17 @@ def proccess_absorb(lines, discos, is_bdk=False):
     CURRENT_MAX_SHIELD = {}
     ABSORBS = defaultdict(lambda: defaultdict(int))
     ABSORBS_DETAILS = []
-    for ts, flag, sGUID, sName, tGUID, tName, _id, spell_name, _ABSORB, _DAMAGE, res, sch in lines:
+    DETAILS_ROWS = []
+    ABSORBED = []
+    def add_absorb(source_guid: str, spell_id: str, value: int):
+        ABSORBS[source_guid][spell_id] += value
+        ABSORBED.append((row, source_guid, spell_id, value))
+
+    def add_detail(detail: tuple):
+        ABSORBS_DETAILS.append(detail)
+        DETAILS_ROWS.append(row)
+
+    for ts, flag, sGUID, sName, tGUID, tName, _id, spell_name, _ABSORB, _DAMAGE, res, sch, row in lines:
         _ABSORB = to_int(_ABSORB)
         _DAMAGE = to_int(_DAMAGE)
         # res = int(res)
@@ -411,9 +434,9 @@ def proccess_absorb(lines, discos, is_bdk=False):
         if _ABSORB and _ABSORB != "0":
             _line = f"{_line} | {_ABSORB:>6} | {_DAMAGE:>6} | {res:>6} | {sch:>6}"
         if _ABSORB:
-            ABSORBS_DETAILS.append((ts, flag, sName, spell_name, _ABSORB, _DAMAGE+_ABSORB))
+            add_detail((ts, flag, sName, spell_name, _ABSORB, _DAMAGE+_ABSORB))
         else:
-            ABSORBS_DETAILS.append((ts, flag, sName, spell_name, "", ""))
+            add_detail((ts, flag, sName, spell_name, "", ""))
         # print(_line)
             
         if flag == "DAMAGE_SPLIT":
@@ -488,13 +511,13 @@ def proccess_absorb(lines, discos, is_bdk=False):
                     # print("0"*100, "WTF", ratio)
                     if int(45 - ratio) == 0:
                         if flag != "SWING_DAMAGE":
-                            ABSORBS[tGUID]["49497"] += _ABSORB
-                            ABSORBS_DETAILS.append((ts, "ADDED_sd1", tName, "Spell Deflection", _ABSORB, ""))
+                            add_absorb(tGUID, "49497", _ABSORB)
+                            add_detail((ts, "ADDED_sd1", tName, "Spell Deflection", _ABSORB, ""))
                             _ABSORB = 0
                             # prettyprint("++++??sd1 ADDED", _ABSORB, "Spell Deflection", tName)
                     elif int(15 - ratio) == 0:
-                        ABSORBS[tGUID]["52286"] += _ABSORB
-                        ABSORBS_DETAILS.append((ts, "ADDED_wn1", tName, "Will of the Necropolis", _ABSORB, ""))
+                        add_absorb(tGUID, "52286", _ABSORB)
+                        add_detail((ts, "ADDED_wn1", tName, "Will of the Necropolis", _ABSORB, ""))
                         _ABSORB = 0
                         # prettyprint("++++??wn0 ADDED", _ABSORB, "Will of the Necropolis", tName)
                     elif ratio > 45:
@@ -507,20 +530,20 @@ def proccess_absorb(lines, discos, is_bdk=False):
                             if _max_cap and _rem_abs > _max_cap - 15 :
                                 _abs = int((_ABSORB + _DAMAGE) * .15)
                                 _ABSORB = _ABSORB - _abs
-                                ABSORBS[tGUID]["52286"] += _abs
-                                ABSORBS_DETAILS.append((ts, "ADDED_wn2", tName, "Will of the Necropolis", _abs, ""))
+                                add_absorb(tGUID, "52286", _abs)
+                                add_detail((ts, "ADDED_wn2", tName, "Will of the Necropolis", _abs, ""))
                                 # prettyprint("++++??wn2 ADDED", _abs, "Will of the Necropolis", tName)
                             elif _rem_abs > _max_avg - 15:
                                 _abs = int((_ABSORB + _DAMAGE) * .45)
                                 _ABSORB = _ABSORB - _abs
-                                ABSORBS[tGUID]["49497"] += _abs
-                                ABSORBS_DETAILS.append((ts, "ADDED_sd2", tName, "Spell Deflection", _abs, ""))
+                                add_absorb(tGUID, "49497", _abs)
+                                add_detail((ts, "ADDED_sd2", tName, "Spell Deflection", _abs, ""))
                                 # prettyprint("++++??sd2 ADDED", _abs, "Spell Deflection", tName)
                             elif abs(_DAMAGE * 3 - _ABSORB) > 10:
                                 _abs = int((_ABSORB + _DAMAGE) * .15)
                                 _ABSORB = _ABSORB - _abs
-                                ABSORBS[tGUID]["52286"] += _abs
-                                ABSORBS_DETAILS.append((ts, "ADDED_wn3", tName, "Will of the Necropolis", _abs, ""))
+                                add_absorb(tGUID, "52286", _abs)
+                                add_detail((ts, "ADDED_wn3", tName, "Will of the Necropolis", _abs, ""))
                                 # prettyprint("++++??wn3 ADDED", _abs, "Will of the Necropolis", tName)
                             # elif _rem_abs < 0:
                             # else:
@@ -531,14 +554,14 @@ def proccess_absorb(lines, discos, is_bdk=False):
                         elif flag != "SWING_DAMAGE" and _ABSORB > _max_cap + 500:
                             _rem_abs = int((_ABSORB + _DAMAGE) * .45)
                             _ABSORB = _ABSORB - _rem_abs
-                            ABSORBS[tGUID]["49497"] += _rem_abs
-                            ABSORBS_DETAILS.append((ts, "ADDED_sd3", tName, "Spell Deflection", _rem_abs, ""))
+                            add_absorb(tGUID, "49497", _rem_abs)
+                            add_detail((ts, "ADDED_sd3", tName, "Spell Deflection", _rem_abs, ""))
                             # prettyprint("++++??sd3 ADDED", _abs, "Spell Deflection", tName)
                     elif ratio > 15 and _ABSORB > _max_cap + 500:
                         _rem_abs = int((_ABSORB + _DAMAGE) * .15)
                         _ABSORB = _ABSORB - _rem_abs
-                        ABSORBS[tGUID]["52286"] += _rem_abs
-                        ABSORBS_DETAILS.append((ts, "ADDED_wnx4", tName, "Will of the Necropolis", _rem_abs, ""))
+                        add_absorb(tGUID, "52286", _rem_abs)
+                        add_detail((ts, "ADDED_wnx4", tName, "Will of the Necropolis", _rem_abs, ""))
                         # prettyprint("++++??wn1 ADDED", _abs, "Will of the Necropolis", tName)
 
             for current_shield_id in CURRENT_SHIELD_IDS:
@@ -571,15 +594,15 @@ def proccess_absorb(lines, discos, is_bdk=False):
                         else:
                             _ABSORB = _ABSORB - _abs
                         # prettyprint("+++++++++ ADDED", _abs, SPELLS_NAMES[current_shield_id], CURR_SHIELD["sName"])
-                        ABSORBS[CURR_SHIELD["sGUID"]]["48707"] += _abs
-                        ABSORBS_DETAILS.append((ts, "ADDED", CURR_SHIELD["sName"], SPELLS_NAMES[current_shield_id], _abs, ""))
+                        add_absorb(CURR_SHIELD["sGUID"], "48707", _abs)
+                        add_detail((ts, "ADDED", CURR_SHIELD["sName"], SPELLS_NAMES[current_shield_id], _abs, ""))
                 
                 elif current_shield_id in DMG_SPLIT:
                     _abs = CURR_SHIELD["remain"]
                     _ABSORB = _ABSORB - _abs
                     # prettyprint("+++++++++ ADDED", _abs, SPELLS_NAMES[current_shield_id], CURR_SHIELD["sName"])
-                    ABSORBS[CURR_SHIELD["sGUID"]][current_shield_id] += _abs
-                    ABSORBS_DETAILS.append((ts, "ADDED", CURR_SHIELD["sName"], SPELLS_NAMES[current_shield_id], _abs, ""))
+                    add_absorb(CURR_SHIELD["sGUID"], current_shield_id, _abs)
+                    add_detail((ts, "ADDED", CURR_SHIELD["sName"], SPELLS_NAMES[current_shield_id], _abs, ""))
 
                 elif current_shield_id in IDKSHIELDS:
                     if current_shield_id == DAEGIS and "ts" in CURR_SHIELD:
@@ -612,8 +635,8 @@ def proccess_absorb(lines, discos, is_bdk=False):
                         CURR_SHIELD["remain"] = 0
                         _ABSORB = _ABSORB - currv
                     # prettyprint("+++++++++ ADDED", _abs, SPELLS_NAMES[current_shield_id], CURR_SHIELD["sName"])
-                    ABSORBS[CURR_SHIELD["sGUID"]][current_shield_id] += _abs
-                    ABSORBS_DETAILS.append((ts, "ADDED", CURR_SHIELD["sName"], SPELLS_NAMES[current_shield_id], _abs, ""))
+                    add_absorb(CURR_SHIELD["sGUID"], current_shield_id, _abs)
+                    add_detail((ts, "ADDED", CURR_SHIELD["sName"], SPELLS_NAMES[current_shield_id], _abs, ""))
                 else:
                     pass
                     # prettyprint("++++++??? ADDED", _ABSORB, SPELLS_NAMES[current_shield_id], CURR_SHIELD["sName"])
@@ -638,58 +661,139 @@ def proccess_absorb(lines, discos, is_bdk=False):
             if _LAST_SHIELD is None:
                 continue
             # prettyprint(">>>>>>>> REMAIN", _ABSORB, _LAST_SHIELD["sName"], SPELLS_NAMES[_LAST_SHIELD_ID])
-            ABSORBS_DETAILS.append((ts, "REMAIN", "nil", str(_filtered_shit), _ABSORB, ""))
+            add_detail((ts, "REMAIN", "nil", str(_filtered_shit), _ABSORB, ""))
             if _LAST_SHIELD_ID in IGNORED_MAX_VALUES2:
                 continue
             
-            ABSORBS[_LAST_SHIELD["sGUID"]][_LAST_SHIELD_ID] += _ABSORB
+            add_absorb(_LAST_SHIELD["sGUID"], _LAST_SHIELD_ID, _ABSORB)
             if _LAST_SHIELD_ID in CURRENT_MAX_SHIELD:
                 CURRENT_MAX_SHIELD[_LAST_SHIELD_ID] += _ABSORB
             else:
                 _max_default = ABSORB_SPELLS.get(_LAST_SHIELD_ID, {}).get("avg", 0)
                 CURRENT_MAX_SHIELD[_LAST_SHIELD_ID] = _max_default + _ABSORB
             # prettyprint("....... NEW MAX", CURRENT_MAX_SHIELD[_LAST_SHIELD_ID], CURR_SHIELD["sName"], SPELLS_NAMES[_LAST_SHIELD_ID])
-    return ABSORBS, ABSORBS_DETAILS
+    return ABSORBS, ABSORBS_DETAILS, DETAILS_ROWS, ABSORBED
 
 
 class Absorbs(logs_base.THE_LOGS):
-    @logs_base.cache_wrap
-    def _get_absorbs(self, s, f):
-        if not s or not f:
-            return {}, {}
+    @property
+    def ABSORBS_COUNTERS(self) -> tuple[list[tuple[str, str, str]], UnitsPrefixSums]:
+        '''(target, source, spell) keys and cumulative absorbs of every key, from 1 run over the whole report'''
+        try:
+            return self.__ABSORBS_COUNTERS
+        except AttributeError:
+            self.__ABSORBS_COUNTERS = self._get_absorbs_counters()
+            return self.__ABSORBS_COUNTERS
 
-        logs_slice = self.LOGS[s:f]
-        specs = self.get_players_specs_in_segments(s, f)
+    @property
+    def absorbs_directory(self):
+        return self.relative_path(ABSORBS_DIR_NAME)
+
+    @property
+    def absorbs_details_directory(self):
+        return self.absorbs_directory / ABSORBS_DETAILS_DIR_NAME
+
+    @property
+    def absorbs_stride(self):
+        return len(self.LOGS) + 1
+
+    def _get_absorbs_counters(self):
+        try:
+            return self._read_absorbs_counters()
+        except Exception:
+            return self._redo_absorbs_counters()
+
+    def _read_absorbs_counters(self):
+        directory = self.absorbs_directory
+        stride = self.absorbs_stride
+        keys_data = (directory / ABSORBS_KEYS_FILE_NAME).json()
+        if keys_data["stride"] != stride:
+            raise ValueError("Outdated absorbs, logs were redone")
+        keys = [tuple(key) for key in keys_data["keys"]]
+        return keys, UnitsPrefixSums.load(directory, ABSORBS_SUMS_NAME, stride)
+
+    @running_time
+    def _redo_absorbs_counters(self):
+        stride = self.absorbs_stride
+        specs = self.get_players_specs_in_segments(None, None)
         discos = {guid for guid, spec in specs.items() if spec == 21}
-        events = parse_absorb_related(logs_slice, discos=discos)
-        ABSORBS: dict[str, dict[str, dict[str, int]]] = {}
-        DETAILS = {}
-        
+        events = parse_absorb_related(self.LOGS, discos=discos)
+
+        directory = self.absorbs_directory
+        details_directory = self.absorbs_details_directory
+        (directory / ABSORBS_KEYS_FILE_NAME).unlink(missing_ok=True)
+        shutil.rmtree(details_directory, ignore_errors=True)
+        details_directory.mkdir(parents=True)
+
+        keys = IdsTable()
+        rows = []
+        units = []
+        values = []
         for target, lines in events.items():
-            _absorbs, _details = proccess_absorb(lines, discos, specs.get(target) == 1)
-            ABSORBS[target] = _absorbs
-            DETAILS[target] = _details
+            _, details, details_rows, absorbed = proccess_absorb(lines, discos, specs.get(target) == 1)
+            for row, source, spell_id, value in absorbed:
+                rows.append(row)
+                units.append(keys[(target, source, spell_id)])
+                values.append(value)
+            self._save_absorbs_details(target, details, details_rows)
+
+        counters = UnitsPrefixSums.from_rows(
+            numpy.array(units, dtype=numpy.int64),
+            numpy.array(rows, dtype=numpy.int64),
+            numpy.array(values, dtype=numpy.int64),
+            stride,
+        )
+
+        counters.save(directory, ABSORBS_SUMS_NAME)
+        # saved last, marks that counters and details are saved
+        keys_path = directory / ABSORBS_KEYS_FILE_NAME
+        keys_temp_path = keys_path.temp_path
+        keys_temp_path.json_write({"stride": stride, "keys": keys.values})
+        os.replace(keys_temp_path, keys_path)
+        return keys.values, counters
+
+    def _save_absorbs_details(self, target: str, details: list[tuple], rows: list[int]):
+        path = self.absorbs_details_directory / f"{target}.zstd"
+        temp_path = path.temp_path
+        temp_path.zstd_write(json.dumps({"rows": rows, "details": details}).encode())
+        os.replace(temp_path, path)
+
+    def _read_absorbs_details(self, target: str) -> tuple[list[int], list[tuple]]:
+        # counters and details are made in the same run
+        self.ABSORBS_COUNTERS
+        try:
+            data = json.loads((self.absorbs_details_directory / f"{target}.zstd").zstd_read())
+        except FileNotFoundError:
+            return [], []
+        return data["rows"], [tuple(detail) for detail in data["details"]]
 
-        return ABSORBS, DETAILS
-    
     def get_absorbs(self, s, f):
-        return self._get_absorbs(s, f)[0]
-    
-    def get_absorbs_details(self, s, f):
-        return self._get_absorbs(s, f)[1]
-    
+        '''{target: {source: {spell_id: absorbed}}}, shields applied before the slice are included'''
+        if not s or not f:
+            return {}
+
+        keys, counters = self.ABSORBS_COUNTERS
+        ABSORBS: dict[str, dict[str, dict[str, int]]] = {}
+        for (target, source, spell_id), value in counters.totals(keys, s, f).items():
+            if target not in ABSORBS:
+                ABSORBS[target] = defaultdict(lambda: defaultdict(int))
+            ABSORBS[target][source][spell_id] = value
+        return ABSORBS
+
     def get_absorbs_details_wrap(self, segments: list, target: str):
+        '''details of the target from the same run as get_absorbs, shields applied before the slice are included'''
         if not target.startswith("0x0"):
             target = self.name_to_guid(target)
 
         if not target:
             return []
         
+        rows, details = self._read_absorbs_details(target)
         DETAILS = []
         for s, f in segments:
-            _a = self.get_absorbs_details(s, f)
-            if target in _a:
-                DETAILS.extend(self.get_absorbs_details(s, f)[target])
+            if not s or not f:
+                continue
+            DETAILS.extend(details[bisect_left(rows, s):bisect_left(rows, f)])
         return DETAILS
 
     def get_absorbs_by_source(self, s, f):
@@ -764,7 +868,7 @@ def _test():
         print(len(sources), sources)
         print(lines[0])
         # continue
-        _absorbs, _details = proccess_absorb(lines, discos, is_bdk)
+        _absorbs, _details, _, _ = proccess_absorb(lines, discos, is_bdk)
         ABSORBS2[target] = _absorbs
         ABSORBS_DETAILS[target] = _details
         # print(_absorbs)
@@ -0,0 +1,238 @@
+'''
+Aura events of every (target, spell) with integer milliseconds timestamps.
+Built once from events columns and saved as .npy files inside AURAS directory next to them.
+Files are replaced, not written over, other processes might have them memory mapped.
+Auras of any slice are 2 binary searches per (target, spell) instead of reading every line of the slice.
+
+key        - group * stride + line index, sorted, groups are (target, spell) sorted
+timestamps - milliseconds of every aura event in keys order, same as LINES_MS
+flags      - AURA_OTHER, AURA_APPLIED or AURA_REMOVED
+units      - target id of every group
+spells     - spell id of every group
+'''
+
+import numpy
+
+import logs_base
+from c_path import PathExt
+from h_debug import running_time
+from logs_events import group_rows
+
+AURAS_DIR_NAME = "AURAS"
+STRIDE_FILE_NAME = "stride.npy"
+AURA_EVENTS_VERSION = 2
+AURA_OTHER = 0
+AURA_APPLIED = 1
+AURA_REMOVED = 2
+AURA_FLAGS = {
+    "SPELL_AURA_APPLIED": AURA_APPLIED,
+    "SPELL_AURA_REMOVED": AURA_REMOVED,
+}
+
+
+def ranges_indexes(lo: numpy.ndarray, hi: numpy.ndarray):
+    '''concatenated numpy.arange(lo[i], hi[i]) of every i'''
+    lengths = hi - lo
+    offsets = numpy.cumsum(lengths) - lengths
+    return numpy.repeat(lo - offsets, lengths) + numpy.arange(lengths.sum())
+
+
+class AuraWindow:
+    '''Aura events of a slice grouped by (target, spell), groups are in order of their first line.
+    Like the old line by line parsing, every group starts with applied and ends with removed:
+    aura is applied at the slice start if the 1st event is not applied
+    and removed at the slice end if the last event is not removed.'''
+    def __init__(self, units: numpy.ndarray, spells: numpy.ndarray, groups: numpy.ndarray, timestamps: numpy.ndarray, flags: numpy.ndarray, slice_start: int, slice_end: int) -> None:
+        self.units = units
+        self.spells = spells
+        self.groups = groups
+        self.timestamps = timestamps
+        self.flags = flags
+        self.slice_start = slice_start
+        self.slice_end = slice_end
+
+    def __len__(self):
+        return len(self.units)
+
+    def timestamps_of(self, spell_id: int):
+        '''sorted unique timestamps of all targets of the spell'''
+        in_spell = numpy.isin(self.groups, numpy.flatnonzero(self.spells == spell_id))
+        return numpy.unique(self.timestamps[in_spell])
+
+    def pairs_uptime(self, max_durations: numpy.ndarray):
+        '''count and uptime in ms of every group
+        from every event, except removed, until the next event of the group, capped by group's max duration'''
+        is_pair = self.groups[:-1] == self.groups[1:]
+        is_pair &= self.flags[:-1] != AURA_REMOVED
+        pairs = numpy.flatnonzero(is_pair)
+        pair_groups = self.groups[pairs]
+        deltas = self.timestamps[pairs+1] - self.timestamps[pairs]
+        deltas = numpy.minimum(deltas, max_durations[pair_groups])
+        positive = deltas > 0
+        pair_groups = pair_groups[positive]
+        counts = numpy.bincount(pair_groups, minlength=len(self))
+        uptimes = numpy.bincount(pair_groups, deltas[positive], minlength=len(self))
+        return counts, uptimes
+
+    def applied_uptime(self):
+        '''count and uptime in ms of every group
+        from applied until removed, applied and refreshes while aura is up are counted'''
+        is_switch = self.flags != AURA_OTHER
+        last_switch = numpy.maximum.accumulate(numpy.where(is_switch, numpy.arange(len(self.flags)), 0))
+        is_up_after = self.flags[last_switch] == AURA_APPLIED
+        is_up = numpy.zeros(len(self.flags), dtype=bool)
+        is_up[1:] = is_up_after[:-1] & (self.groups[1:] == self.groups[:-1])
+
+        is_applied = (self.flags == AURA_APPLIED) & ~is_up
+        is_removed = (self.flags == AURA_REMOVED) & is_up
+        counted = is_applied | (is_up & (self.flags != AURA_REMOVED))
+        counts = numpy.bincount(self.groups[counted], minlength=len(self))
+        uptimes = numpy.bincount(self.groups[is_removed], self.timestamps[is_removed], minlength=len(self))
+        uptimes -= numpy.bincount(self.groups[is_applied], self.timestamps[is_applied], minlength=len(self))
+        return counts, uptimes
+
+
+class AuraEvents:
+    def __init__(self, keys: numpy.ndarray, timestamps: numpy.ndarray, flags: numpy.ndarray, units: numpy.ndarray, spells: numpy.ndarray, stride: int) -> None:
+        self.keys = keys
+        self.timestamps = timestamps
+        self.flags = flags
+        self.units = units
+        self.spells = spells
+        self.stride = stride
+
+    @classmethod
+    def from_rows(cls, rows: numpy.ndarray, timestamps: numpy.ndarray, flags: numpy.ndarray, units: numpy.ndarray, spells: numpy.ndarray, stride: int):
+        order = numpy.lexsort((rows, spells, units))
+        units = units[order].astype(numpy.int64)
+        spells = spells[order].astype(numpy.int64)
+        is_new_group = numpy.ones(len(order), dtype=bool)
+        is_new_group[1:] = (units[1:] != units[:-1]) | (spells[1:] != spells[:-1])
+        groups = numpy.cumsum(is_new_group) - 1
+        keys = groups * stride + rows[order]
+        return cls(keys, timestamps[order], flags[order], units[is_new_group], spells[is_new_group], stride)
+
+    @classmethod
+    def load(cls, directory: PathExt, stride: int):
+        return cls(
+            numpy.load(directory / "keys.npy", mmap_mode="r"),
+            numpy.load(directory / "timestamps.npy", mmap_mode="r"),
+            numpy.load(directory / "flags.npy", mmap_mode="r"),
+            numpy.load(directory / "units.npy"),
+            numpy.load(directory / "spells.npy"),
+            stride,
+        )
+
+    def save(self, directory: PathExt):
+        (directory / "keys.npy").npy_write(self.keys)
+        (directory / "timestamps.npy").npy_write(self.timestamps)
+        (directory / "flags.npy").npy_write(self.flags)
+        (directory / "units.npy").npy_write(self.units)
+        (directory / "spells.npy").npy_write(self.spells)
+
+    def window(self, spells: dict[int, int], s: int, f: int, slice_start: int, slice_end: int):
+        '''auras of the spells in [s, f), spells are mapped to the main spell of their group'''
+        in_spells = numpy.flatnonzero(numpy.isin(self.spells, list(spells)))
+        groups_start = in_spells * self.stride
+        lo = numpy.searchsorted(self.keys, groups_start + s)
+        hi = numpy.searchsorted(self.keys, groups_start + f)
+        in_slice = hi > lo
+        lengths = (hi - lo)[in_slice]
+        events = ranges_indexes(lo[in_slice], hi[in_slice])
+
+        stored_groups = in_spells[in_slice]
+        main_spells = numpy.array([spells[spell_id] for spell_id in self.spells[stored_groups].tolist()], dtype=numpy.int64)
+        units = numpy.repeat(self.units[stored_groups], lengths)
+        spells_column = numpy.repeat(main_spells, lengths)
+        rows = numpy.asarray(self.keys[events]) - numpy.repeat(groups_start[in_slice], lengths)
+        timestamps = numpy.asarray(self.timestamps[events])
+        flags = numpy.asarray(self.flags[events])
+
+        by_row = numpy.argsort(rows, kind="stable")
+        groups, first = group_rows(units[by_row], spells_column[by_row])
+        rows = rows[by_row]
+        timestamps = timestamps[by_row]
+        flags = flags[by_row]
+        in_order = numpy.argsort(groups, kind="stable")
+        groups_order = groups[in_order]
+        groups_count = len(first)
+        groups_first = numpy.searchsorted(groups_order, numpy.arange(groups_count))
+        groups_last = numpy.searchsorted(groups_order, numpy.arange(groups_count), side="right") - 1
+        add_applied = numpy.flatnonzero(flags[in_order[groups_first]] != AURA_APPLIED)
+        add_removed = numpy.flatnonzero(flags[in_order[groups_last]] != AURA_REMOVED)
+
+        groups = numpy.concatenate((groups, add_applied, add_removed))
+        rows = numpy.concatenate((rows, numpy.full(len(add_applied), -1), numpy.full(len(add_removed), self.stride)))
+        timestamps = numpy.concatenate((timestamps, numpy.full(len(add_applied), slice_start), numpy.full(len(add_removed), slice_end)))
+        flags = numpy.concatenate((flags, numpy.full(len(add_applied), AURA_APPLIED), numpy.full(len(add_removed), AURA_REMOVED)))
+        order = numpy.lexsort((rows, groups))
+        return AuraWindow(
+            units[by_row][first],
+            spells_column[by_row][first],
+            groups[order],
+            timestamps[order].astype(numpy.int64),
+            flags[order],
+            slice_start,
+            slice_end,
+        )
+
+
+class AuraIntervals(logs_base.THE_LOGS):
+    @property
+    def AURA_EVENTS(self) -> AuraEvents:
+        try:
+            return self.__AURA_EVENTS
+        except AttributeError:
+            self.__AURA_EVENTS = self._get_aura_events()
+            return self.__AURA_EVENTS
+
+    @property
+    def aura_events_directory(self):
+        return self.events_directory / AURAS_DIR_NAME
+
+    @property
+    def aura_events_stride(self):
+        return len(self.EVENTS["timestamp"]) + 1
+
+    def _get_aura_events(self):
+        try:
+            return self._read_aura_events()
+        except Exception:
+            return self._redo_aura_events()
+
+    def _read_aura_events(self):
+        directory = self.aura_events_directory
+        stride = self.aura_events_stride
+        if numpy.load(directory / STRIDE_FILE_NAME).tolist() != [stride, AURA_EVENTS_VERSION]:
+            raise ValueError("Outdated aura events, events were redone")
+        return AuraEvents.load(directory, stride)
+
+    @running_time
+    def _redo_aura_events(self):
+        events = self.EVENTS
+        stride = self.aura_events_stride
+        flag_ids = events.flag_ids(lambda flag: flag.startswith("SPELL_AURA"))
+        rows = numpy.flatnonzero(numpy.isin(events["flag"], flag_ids))
+        flags_table = numpy.array([AURA_FLAGS.get(flag, AURA_OTHER) for flag in events.FLAGS], dtype=numpy.uint8)
+        aura_events = AuraEvents.from_rows(
+            rows,
+            self.LINES_MS[rows],
+            flags_table[events["flag"][rows]],
+            numpy.asarray(events["target"][rows]),
+            numpy.asarray(events["spell"][rows]),
+            stride,
+        )
+
+        directory = self.aura_events_directory
+        directory.mkdir(exist_ok=True)
+        (directory / STRIDE_FILE_NAME).unlink(missing_ok=True)
+        aura_events.save(directory)
+        # saved last, marks that everything is saved
+        (directory / STRIDE_FILE_NAME).npy_write(numpy.array([stride, AURA_EVENTS_VERSION]))
+        return aura_events
+
+    def get_aura_window(self, spells: dict[int, int], s: int=None, f: int=None):
+        s = 0 if s is None else s
+        f = self.aura_events_stride - 1 if f is None else f
+        lines_ms = self.LINES_MS
+        return self.AURA_EVENTS.window(spells, s, f, int(lines_ms[s]), int(lines_ms[f-1]))
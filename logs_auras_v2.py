@@ -1,8 +1,12 @@
 from collections import defaultdict
 
+import numpy
+
+import logs_aura_intervals
 import logs_base
 from h_debug import running_time
 from h_other import sort_dict_by_value
+from logs_aura_intervals import AuraWindow
 
 DEFAULT_DURATION = 60
 ROOM_DURATION = 50
@@ -224,6 +228,11 @@ ICC_BUFFS = set(MULTISPELLS["73822"]) | set(MULTISPELLS["73828"])
 SPELLS = AURAS_SELF | AURAS_EXTERNAL | AURAS_BOSS_MECHANICS | AURAS_SPEC
 for spell_id, spell_id_main in MULTISPELLS_D.items():
     SPELLS[spell_id] = SPELLS[spell_id_main]
+SPELLS_IDS = {
+    int(spell_id): int(MULTISPELLS_D.get(spell_id, spell_id))
+    for spell_id in SPELLS
+}
+ICC_BUFFS_IDS = {int(spell_id) for spell_id in ICC_BUFFS}
 
 
 
@@ -254,91 +263,19 @@ class AuraUptimeDuration(Aura):
     pass
 
 
-class AuraLine:
-    __slots__ = "timestamp", "flag"
-    def __init__(self, timestamp: str, flag: str) -> None:
-        self.timestamp = timestamp
-        self.flag = flag
-
-
-class AuraLines(list[AuraLine]):
-    def calc_total_uptime(self, spell_id: str, delta_func):
-        MAX_DURATION = SPELLS.get(spell_id, DEFAULT_DURATION)
-        applied_timestamp = None
-        aura = AuraUptimeDuration()
-        for aura_line in self:
-            if applied_timestamp is not None:
-                _delta = delta_func(applied_timestamp, aura_line.timestamp)
-                _delta = min(_delta, MAX_DURATION)
-                if _delta > 0:
-                    aura.count += 1
-                    aura.uptime += _delta
-            if aura_line.flag == "SPELL_AURA_REMOVED":
-                applied_timestamp = None
-            else:
-                applied_timestamp = aura_line.timestamp
-        return aura
-
-
-class AuraLinesSources(dict[str, AuraLines]):
-    def __missing__(self, key):
-        v = self[key] = AuraLines()
-        return v
-
+def check_icc_buff(window: AuraWindow):
+    targets = defaultdict(list)
+    for unit_id, spell_id in zip(window.units.tolist(), window.spells.tolist()):
+        targets[unit_id].append(spell_id)
 
-class AuraLinesByTarget(dict[str, AuraLinesSources]):
-    def __missing__(self, key):
-        v = self[key] = AuraLinesSources()
-        return v
-    
-    @running_time
-    def __init__(self, logs_slice: list[str]):
-        for line in logs_slice:
-            if "SPELL_A" not in line:
-                continue
-            _line = line.split(',', 7)
-            if _line[6] not in SPELLS:
-                continue
+    icc = defaultdict(int)
+    for target_spells in targets.values():
+        for spell_id in target_spells:
+            if spell_id in ICC_BUFFS_IDS:
+                icc[str(spell_id)] += 1
 
-            # if _line[6] == "16886":
-            #     print(line)
-            
-            spell_id = MULTISPELLS_D.get(_line[6], _line[6])
-            self[_line[4]][spell_id].append(AuraLine(*_line[:2]))
-        
-        self._add_missing_events(logs_slice)
-
-    def _add_missing_events(self, logs_slice: list[str]):
-        first_timestamp = logs_slice[0].split(',', 1)[0]
-        last_timestamp = logs_slice[-1].split(',', 1)[0]
-        AURA_APPLIED = AuraLine(first_timestamp, "SPELL_AURA_APPLIED")
-        AURA_REMOVED = AuraLine(last_timestamp, "SPELL_AURA_REMOVED")
-        for spells in self.values():
-            for aura_timestamps in spells.values():
-                if aura_timestamps[0].flag != "SPELL_AURA_APPLIED":
-                    aura_timestamps.insert(0, AURA_APPLIED)
-                if aura_timestamps[-1].flag != "SPELL_AURA_REMOVED":
-                    aura_timestamps.append(AURA_REMOVED)
-
-    def check_icc_buff(self):
-        icc = defaultdict(int)
-        for target_guid, target_data in self.items():
-            for spell_id in target_data:
-                if spell_id in ICC_BUFFS:
-                    icc[spell_id] += 1
-
-        if icc:
-            return list(sort_dict_by_value(icc))[0]
-
-    def room_grabs_timestamps(self):
-        timestamps = set()
-        for target_guid, target_data in self.items():
-            for spell_id, aura_lines in target_data.items():
-                if spell_id != ROOM_AURA_ID:
-                    continue
-                g_timestamps = (aura_line.timestamp for aura_line in aura_lines)
-                timestamps.update(g_timestamps)
-        return timestamps
+    if icc:
+        return list(sort_dict_by_value(icc))[0]
 
 
 class AuraUptimeDurationByTarget(dict[str, dict[str, AuraUptimeDuration]]):
@@ -347,12 +284,18 @@ class AuraUptimeDurationByTarget(dict[str, dict[str, AuraUptimeDuration]]):
         return v
     
     # @running_time
-    def __init__(self, data: AuraLinesByTarget, delta_func) -> None:
-        for target_guid, target_data in data.items():
-            for spell_id, aura_timestamps in target_data.items():
-                if target_guid[:3] != "0x0":
-                    continue
-                self[target_guid][spell_id] = aura_timestamps.calc_total_uptime(spell_id, delta_func)
+    def __init__(self, window: AuraWindow, guids: list[str]) -> None:
+        max_durations = numpy.array([
+            SPELLS.get(str(spell_id), DEFAULT_DURATION) * 1000
+            for spell_id in window.spells.tolist()
+        ], dtype=numpy.int64)
+        counts, uptimes = window.pairs_uptime(max_durations)
+        groups = zip(window.units.tolist(), window.spells.tolist(), counts.tolist(), uptimes.tolist())
+        for unit_id, spell_id, count, uptime in groups:
+            target_guid = guids[unit_id]
+            if target_guid[:3] != "0x0":
+                continue
+            self[target_guid][str(spell_id)] = AuraUptimeDuration(count, uptime / 1000)
 
 
 class AuraUptimePercentageByTarget(dict[str, dict[str, AuraUptimePercentage]]):
@@ -369,20 +312,19 @@ class AuraUptimePercentageByTarget(dict[str, dict[str, AuraUptimePercentage]]):
 
 
 
-class AurasUptimes(logs_base.THE_LOGS):
-    @logs_base.cache_wrap
+class AurasUptimes(logs_aura_intervals.AuraIntervals):
+    @logs_base.disk_cache_wrap
     @running_time
     def get_auras_uptime_duration(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        auras_lines = AuraLinesByTarget(logs_slice)
-        auras_uptime = AuraUptimeDurationByTarget(auras_lines, self.get_timedelta_seconds)
+        window = self.get_aura_window(SPELLS_IDS, s, f)
+        auras_uptime = AuraUptimeDurationByTarget(window, self.EVENTS.GUIDS)
 
         custom_auras = {}
-        _room_timestamps = auras_lines.room_grabs_timestamps()
-        if _room_timestamps:
-            custom_auras[ROOM_AURA_ID] = self._aura_lk_room(_room_timestamps, logs_slice[-1])
+        room_timestamps = window.timestamps_of(int(ROOM_AURA_ID))
+        if len(room_timestamps):
+            custom_auras[ROOM_AURA_ID] = self._aura_lk_room(room_timestamps.tolist(), window.slice_end)
         
-        icc_buff = auras_lines.check_icc_buff()
+        icc_buff = check_icc_buff(window)
         if icc_buff:
             duration = self.get_slice_duration(s, f)
             custom_auras[icc_buff] = AuraUptimeDuration(1, duration)
@@ -405,17 +347,16 @@ class AurasUptimes(logs_base.THE_LOGS):
         s, f = self.get_enc_data()[boss][attempt]
         return self.get_auras_uptime_percentage(s, f)
 
-    def _aura_lk_room(self, _room_timestamps: set[str], last_line: str):
+    def _aura_lk_room(self, room_timestamps: list[int], slice_end: int):
         room_aura = AuraUptimeDuration(count=1)
         
-        room_timestamps = sorted(_room_timestamps)
         for x, y in zip(room_timestamps, room_timestamps[1:]):
-            if self.get_timedelta_seconds(x, y) > 60:
+            if (y - x) / 1000 > 60:
                 room_aura.count += 1
                 room_aura.uptime += ROOM_DURATION
         
         last_grab = room_timestamps[-1]
-        gap_after_last_room_grab = self.get_timedelta_seconds(last_grab, last_line)
+        gap_after_last_room_grab = (slice_end - last_grab) / 1000
         room_aura.uptime += min(gap_after_last_room_grab, ROOM_DURATION)
         if gap_after_last_room_grab < 10:
             room_aura.count -= 1
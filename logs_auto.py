@@ -100,7 +100,7 @@ def group_reports_by_server(new_logs):
     return itertools.groupby(new_logs, key=_report_server)
 
 def _make_report_top_wrap(report_id: str):
-    done = logs_top.make_report_top_wrap(report_id)
+    done = logs_top.make_report_top_wrap(report_id, prewarm=True)
     return report_id, done
 
 def make_top_data(new_logs: list[str], processes: int=1):
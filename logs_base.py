@@ -6,13 +6,14 @@ from bisect import bisect_left
 import logs_fight_separator
 import logs_get_time
 import logs_player_spec
+import logs_precompute
 import logs_spells_list
 import logs_units_guid
 from h_debug import Loggers, running_time
+from logs_core import cache_wrap, disk_cache_wrap, segments_cache_wrap
 
 
 PLAYER = "0x0"
-TYPES = (str, bool, type(None))
 LOGGER_REPORTS = Loggers.reports
 TOTAL_DUMMY_SPEC = {
     "spec": "Total",
@@ -21,24 +22,6 @@ TOTAL_DUMMY_SPEC = {
     "class": "total",
 }
 
-def cache_wrap(func):
-    def cache_inner(self, s, f, *args, **kwargs):
-        slice_ID = f"{s}_{f}"
-        cached_data = self.CACHE[func.__name__]
-        for arg in args:
-            if not isinstance(arg, TYPES):
-                break
-            cached_data = cached_data[arg]
-            
-        if slice_ID in cached_data:
-            return cached_data[slice_ID]
-        
-        data = func(self, s, f, *args, **kwargs)
-        cached_data[slice_ID] = data
-        return data
-
-    return cache_inner
-
 
 class THE_LOGS(
     logs_fight_separator.Fights,
@@ -147,13 +130,15 @@ class THE_LOGS(
             self._redo_guids()
 
     def _read_guids(self):
-        self._guids_all = self.relative_path("GUIDS_DATA.json").json()
-        self._guids_players = self.relative_path("PLAYERS_DATA.json").json()
-        self._guids_classes = self.relative_path("CLASSES_DATA.json").json()
+        self._guids_all = self._read_index_section("guids", "GUIDS_DATA.json")
+        self._guids_players = self._read_index_section("players", "PLAYERS_DATA.json")
+        self._guids_classes = self._read_index_section("classes", "CLASSES_DATA.json")
     
     @running_time
-    def _redo_guids(self):
-        parsed = logs_units_guid.guids_main(self.LOGS, self.ENCOUNTER_DATA)
+    def _redo_guids(self, logs: list[str]=None):
+        if logs is None:
+            logs = self.LOGS
+        parsed = logs_units_guid.guids_main(logs, self.ENCOUNTER_DATA)
 
         if parsed['missing_owner']:
             LOGGER_REPORTS.error(f"{self.NAME} | Missing owners: {parsed['missing_owner']}")
@@ -162,14 +147,31 @@ class THE_LOGS(
         self._guids_players = parsed['players']
         self._guids_classes = parsed['classes']
 
-        to_write = (
-            ("GUIDS_DATA.json", self._guids_all),
-            ("PLAYERS_DATA.json", self._guids_players),
-            ("CLASSES_DATA.json", self._guids_classes),
-        )
+        self.INDEX.save("guids", self._guids_all)
+        self.INDEX.save("players", self._guids_players)
+        self.INDEX.save("classes", self._guids_classes)
 
-        for file_name, data in to_write:
-            self.relative_path(file_name).json_write(data, indent=2)
+    @running_time
+    def precompute(self, new_lines: 'function'=None):
+        '''Redo all report data with 1 pass over LOGS + GUIDs pass.
+        new_lines - upload, returns new iterator over the lines on every call.
+        1st pass finds encounters, 2nd pass writes LOGS_CUT once with frames split on them and scans the rest.'''
+        if new_lines is None:
+            logs = self.LOGS
+            scanned = logs_precompute.scan_logs(logs, self.year)
+            self._redo_enc_data(scanned.boss_lines)
+        else:
+            boss_lines = self._dump_all_boss_lines(line.decode() for line in new_lines())
+            enc_data = self._redo_enc_data(boss_lines)
+            scan = logs_precompute.ScanThrough(self.year)
+            self._write_logs_frames(scan(new_lines()), logs_fight_separator.encounters_boundaries(enc_data))
+            scanned = scan.scanned
+            # GUIDs need random access, LOGS would write shared decompressed copy
+            logs = self._open_logs_private()
+        self._redo_events(scanned.events)
+        self._redo_spells(scanned.spells)
+        self._redo_timestamps(scanned.timestamps)
+        self._redo_guids(logs)
 
     def get_players_guids(self, whitelist_guids=None, whitelist_names=None):
         players = self.PLAYERS_GUIDS
@@ -296,20 +298,12 @@ class THE_LOGS(
         return self.TIMESTAMPS[new_index]
     
     def find_sec_from_start(self, s):
-        return self.get_timedelta_seconds(self.LOGS[0], self.LOGS[s])
+        return self.get_lines_seconds(0, s)
     
     def precise_shift(self, from_index: int, shift_seconds: int):
         if not shift_seconds:
             return from_index
-        first_line = self.LOGS[from_index]
-        shifted_index = shift_seconds + int(self.find_sec_from_start(from_index))
-        s = self.TIMESTAMPS[shifted_index-1]
-        f = self.TIMESTAMPS[shifted_index+1]
-        for i, current_line in enumerate(self.LOGS[s:f]):
-            td = self.get_timedelta(first_line, current_line).total_seconds()
-            if td > shift_seconds:
-                return s+i
-        return self.TIMESTAMPS[shifted_index]
+        return self.find_line_after(from_index, shift_seconds)
 
 
     def get_all_guids(self):
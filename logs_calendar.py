@@ -7,10 +7,12 @@ from datetime import datetime
 import pandas
 import pytz
 
+import logs_index
 import logs_main
 from constants import DEFAULT_SERVER_NAME
 from c_path import (
     Directories,
+    FileNames,
     PathExt,
 )
 from h_debug import running_time
@@ -179,14 +181,15 @@ def make_new(report_ids: list[str]):
     data = {}
     for report_id in report_ids:
         logs_dir = Directories.logs / report_id
-        needed_files = (
-            file_path.is_file()
-            for file_path in [
-                logs_dir / "PLAYERS_DATA.json",
-                logs_dir / "ENCOUNTER_DATA.json",
+        index_sections = logs_index.read_sections(logs_dir / FileNames.report_index)
+        needed_data = (
+            section in index_sections or (logs_dir / file_name).is_file()
+            for section, file_name in [
+                ("players", "PLAYERS_DATA.json"),
+                ("encounters", "ENCOUNTER_DATA.json"),
             ]
         )
-        if not all(needed_files):
+        if not all(needed_data):
             continue
 
         try:
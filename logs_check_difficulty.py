@@ -1,5 +1,5 @@
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 
 import logs_base
 from c_bosses import (
@@ -7,6 +7,7 @@ from c_bosses import (
     COWARDS,
     ENCOUNTER_MIN_DURATION,
 )
+from h_debug import running_time
 from h_other import convert_to_html_name
 
 CSS_BOSS_LINK = "boss-link"
@@ -387,9 +388,37 @@ class LogsSegments(logs_base.THE_LOGS):
         try:
             return self.__SEGMENTS
         except AttributeError:
-            self.__SEGMENTS = self.get_segments()
+            self.__SEGMENTS = self._get_segments()
             return self.__SEGMENTS
 
+    def _get_segments(self):
+        try:
+            return self._read_segments()
+        except Exception:
+            return self._redo_segments()
+
+    def _read_segments(self) -> dict[str, list[LogsSegment]]:
+        segments_data = {
+            boss_name: [LogsSegment(**segment) for segment in segments]
+            for boss_name, segments in self.INDEX["segments"].items()
+        }
+        saved_enc_data = {
+            boss_name: [[segment.start, segment.end] for segment in segments]
+            for boss_name, segments in segments_data.items()
+        }
+        if saved_enc_data != self.ENCOUNTER_DATA:
+            raise ValueError("Outdated segments, encounters were redone")
+        return segments_data
+
+    @running_time
+    def _redo_segments(self):
+        segments_data = self.get_segments()
+        self.INDEX.save("segments", {
+            boss_name: [asdict(segment) for segment in segments]
+            for boss_name, segments in segments_data.items()
+        })
+        return segments_data
+
     @property
     def SEGMENTS_QUERIES(self):
         try:
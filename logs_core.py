@@ -1,5 +1,13 @@
+import sys
 from collections import defaultdict
+from functools import wraps
+from itertools import takewhile
+from time import monotonic
 
+import h_zstd_frames
+import logs_index
+import logs_lines
+from api_slices_cache import SLICES_CACHE
 from c_path import Directories, FileNames
 from h_debug import running_time, setup_logger
 from h_other import get_report_name_info
@@ -10,24 +18,131 @@ from h_datetime import (
 )
 
 TYPES = (str, bool, type(None))
+# False - keep all lines in memory as list of strings
+LOGS_LINES_MMAP = True
+# False - decompress only needed frames in each process instead of shared decompressed logs
+LOGS_LINES_SHARED = True
+# False - disk_cache_wrap only caches in memory
+SLICES_DISK_CACHE = True
+# change if format of cached results changes
+SLICES_CACHE_VERSION = 2
+# counted separately or not report data
+MISSING = object()
+NOT_DATA_ATTRIBUTES = {"CACHE", "CACHE_SIZES", "_Logs__LOGS", "_Logs__LOGGER", "_Logs__data_size"}
+
+def get_deep_size(obj) -> int:
+    '''approximate size of object and everything it references
+    Runs in the cleaner thread, containers are copied in 1 step, requests might be adding keys to them.'''
+    size = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            for item in list(obj.items()):
+                stack.extend(item)
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(tuple(obj))
+        if hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+    return size
+
+def get_cached(self: 'Logs', func: 'function', slice_ID: str, args: tuple, compute: 'function'):
+    cached_data = self.CACHE[func.__name__]
+    cache_key = [func.__name__]
+    for arg in args:
+        if not isinstance(arg, TYPES):
+            break
+        cached_data = cached_data[arg]
+        cache_key.append(arg)
+    cache_key.append(slice_ID)
+    cache_key = tuple(cache_key)
+        
+    # 1 read, cleaner thread might drop it between a check and a read
+    # .get, cached_data might be defaultdict
+    data = cached_data.get(slice_ID, MISSING)
+    if data is not MISSING:
+        self.CACHE_SIZES.touch(cache_key)
+        return data
+    
+    data = compute()
+    cached_data[slice_ID] = data
+    self.CACHE_SIZES.add(cache_key, data)
+    return data
 
 def cache_wrap(func: 'function'):
     def cache_inner(self: 'Logs', s, f, *args, **kwargs):
-        slice_ID = f"{s}_{f}"
-        cached_data = self.CACHE[func.__name__]
-        for arg in args:
-            if not isinstance(arg, TYPES):
-                break
-            cached_data = cached_data[arg]
-            
-        if slice_ID in cached_data:
-            return cached_data[slice_ID]
+        return get_cached(self, func, f"{s}_{f}", args, lambda: func(self, s, f, *args, **kwargs))
+
+    return cache_inner
+
+def segments_cache_wrap(func: 'function'):
+    '''cache_wrap for results merged from segments, e.g. all bosses, all attempts of a boss.
+    Same segments are merged once, cached result must not be changed by callers.
+    Args are part of the cache key, so they must be positional.'''
+    @wraps(func)
+    def segments_cache_inner(self: 'Logs', segments, *args):
+        segments_ID = "|".join(f"{s}_{f}" for s, f in segments)
+        return get_cached(self, func, segments_ID, args, lambda: func(self, segments, *args))
+
+    return segments_cache_inner
+
+def disk_cache_wrap(func: 'function'):
+    '''cache_wrap + results are saved on disk, for slow functions'''
+    @cache_wrap
+    @wraps(func)
+    def disk_cache_inner(self: 'Logs', s, f, *args, **kwargs):
+        if not SLICES_DISK_CACHE:
+            return func(self, s, f, *args, **kwargs)
         
+        key_args = '|'.join(map(str, takewhile(lambda arg: isinstance(arg, TYPES), args)))
+        key = f"{self.NAME}|{self.slices_version}|{func.__name__}|{key_args}|{s}_{f}"
+        try:
+            return SLICES_CACHE.load(key)
+        except KeyError:
+            pass
+
         data = func(self, s, f, *args, **kwargs)
-        cached_data[slice_ID] = data
+        SLICES_CACHE.save(key, data)
         return data
 
-    return cache_inner
+    return disk_cache_inner
+
+
+class CachedSlice:
+    __slots__ = "data", "__size", "last_access"
+    def __init__(self, data) -> None:
+        self.data = data
+        self.last_access = monotonic()
+
+    @property
+    def size(self) -> int:
+        '''estimated when memory is checked, not on every cache miss'''
+        try:
+            return self.__size
+        except AttributeError:
+            self.__size = get_deep_size(self.data)
+            return self.__size
+
+
+class CacheSizes(dict[tuple, CachedSlice]):
+    '''cache key (function name, args, slice) -> size and last access of cached result'''
+    def add(self, cache_key: tuple, data):
+        self[cache_key] = CachedSlice(data)
+
+    def touch(self, cache_key: tuple):
+        try:
+            self[cache_key].last_access = monotonic()
+        except KeyError:
+            pass
+
+    @property
+    def total(self):
+        return sum(cached.size for cached in list(self.values()))
 
 
 class Logs:
@@ -40,6 +155,7 @@ class Logs:
         self.last_access = get_now()
 
         self.CACHE = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
+        self.CACHE_SIZES = CacheSizes()
 
     @property
     def FORMATTED_NAME(self):
@@ -65,6 +181,92 @@ class Logs:
             self.__LOGS = self._open_logs()
             return self.__LOGS
 
+    @property
+    def LOGS_SIZE(self) -> int:
+        '''0 if logs are not opened'''
+        try:
+            return self.__LOGS_SIZE
+        except AttributeError:
+            pass
+        try:
+            logs = self.__LOGS
+        except AttributeError:
+            return 0
+        if isinstance(logs, list):
+            # doesn't change, frames lines size does
+            self.__LOGS_SIZE = sys.getsizeof(logs) + sum(map(sys.getsizeof, logs))
+            return self.__LOGS_SIZE
+        return logs.nbytes
+
+    @property
+    def DATA_SIZE(self) -> int:
+        '''loaded report data: index, events tables, guids etc.
+        Estimated again only when something new is loaded.'''
+        data = {
+            name: value
+            for name, value in list(vars(self).items())
+            if name not in NOT_DATA_ATTRIBUTES
+        }
+        try:
+            key = (len(data), len(self.__INDEX))
+        except AttributeError:
+            key = (len(data), 0)
+        try:
+            data_size_key, data_size = self.__data_size
+            if data_size_key == key:
+                return data_size
+        except AttributeError:
+            pass
+        data_size = get_deep_size(data)
+        self.__data_size = key, data_size
+        return data_size
+
+    def memory_usage(self):
+        '''Memory of this process only.
+        Memory mapped files (LOGS in /dev/shm, events columns, postings etc.) are shared by all workers and aren't counted.'''
+        return {
+            "logs": self.LOGS_SIZE,
+            "data": self.DATA_SIZE,
+            "cache": self.CACHE_SIZES.total,
+        }
+
+    def drop_cached(self, cache_key: tuple):
+        func_name, *args, slice_ID = cache_key
+        cached_data = self.CACHE[func_name]
+        for arg in args:
+            cached_data = cached_data[arg]
+        cached_data.pop(slice_ID, None)
+        self.CACHE_SIZES.pop(cache_key, None)
+
+    @property
+    def INDEX(self):
+        try:
+            return self.__INDEX
+        except AttributeError:
+            self.__INDEX = logs_index.ReportIndex(self.relative_path(FileNames.report_index))
+            return self.__INDEX
+
+    @property
+    def cache_version(self):
+        '''changes if report was reuploaded with the same name'''
+        try:
+            return self.__cache_version
+        except AttributeError:
+            self.__cache_version = self.relative_path(FileNames.logs_cut).stat().st_mtime_ns
+            return self.__cache_version
+
+    @property
+    def slices_version(self):
+        '''saved results are outdated if it's different'''
+        return f"{self.cache_version}.{SLICES_CACHE_VERSION}"
+
+    def _read_index_section(self, name: str, old_file_name: str):
+        try:
+            return self.INDEX[name]
+        except KeyError:
+            # reports before index
+            return self.relative_path(old_file_name).json()
+
     @property
     def LOGGER(self):
         try:
@@ -111,18 +313,14 @@ class Logs:
         seconds = t % 60
         return f"{hours}:{minutes:0>2}:{seconds:0>2}.{milliseconds:0>3.0f}"
 
-    @cache_wrap
-    def get_slice_duration(self, s: int=None, f: int=None):
-        if s is None:
-            s = 0
-        if f is None:
-            f = 0
-        first_line = self.LOGS[s]
-        last_line = self.LOGS[f-1]
-        return self.get_timedelta_seconds(first_line, last_line)
-
-    def get_fight_duration_total(self, segments):
-        return sum(self.get_slice_duration(s, f) for s, f in segments)
+    @running_time
+    def _write_logs_frames(self, lines: list[bytes], boundaries: list[int]=None):
+        '''LOGS_CUT is written once on upload, it's never rewritten while the report is read.'''
+        h_zstd_frames.write_frames(self.relative_path(FileNames.logs_cut), lines, boundaries)
+
+    def _open_logs_private(self):
+        '''only frames that are read are decompressed in this process, e.g. upload worker that never serves the report'''
+        return logs_lines.open_lines(self.relative_path(FileNames.logs_cut), self.NAME, shared=False)
 
     @running_time
     def _open_logs(self):
@@ -132,4 +330,10 @@ class Logs:
             report_dir.copy_from_backup()
             self.__path = report_dir
         
-        return self.relative_path(FileNames.logs_cut).zstd_read().splitlines()
+        logs_path = self.relative_path(FileNames.logs_cut)
+        if LOGS_LINES_MMAP:
+            try:
+                return logs_lines.open_lines(logs_path, self.NAME, LOGS_LINES_SHARED)
+            except OSError:
+                pass
+        return logs_path.zstd_read().splitlines()
@@ -5,6 +5,7 @@ import logs_base
 from h_debug import running_time
 
 
+PLAYER = "0x0"
 DEATH_FLAGS = {"UNIT_DIED", "SPELL_INSTAKILL"}
 HEAL_FLAGS = {"SPELL_HEAL", "SPELL_PERIODIC_HEAL"}
 
@@ -292,12 +293,17 @@ def get_deaths(logs_slice: list[str]):
 
 
 class Deaths(logs_base.THE_LOGS):
-    # @logs_base.cache_wrap
+    def death_lines(self, s, f):
+        '''lines with player as target, get_deaths skips all other lines'''
+        # nil target too, self ressurect casts
+        targets = {guid for guid in self.EVENTS.GUIDS if guid[:3] == PLAYER}
+        return [self.LOGS[n] for n in self.target_lines(targets, s, f).tolist()]
+
+    @logs_base.disk_cache_wrap
     def get_deaths_v2(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        slice_start = logs_slice[0].split(',')[0]
+        slice_start = self.LOGS[s or 0].split(',')[0]
 
-        players_deaths = get_deaths(logs_slice)
+        players_deaths = get_deaths(self.death_lines(s, f))
         players_deaths_sorted = sorted((
             (ts, player_guid, player_death)
             for player_guid, player_deaths in players_deaths.items()
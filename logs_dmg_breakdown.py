@@ -1,8 +1,11 @@
 from collections import defaultdict
 from typing import TypedDict
 
+import numpy
+
 import logs_base
 from h_debug import running_time
+from logs_events import EventsColumns, group_rows
 from h_other import (
     sort_dict_by_value,
     separate_thousands,
@@ -29,6 +32,14 @@ class BreakdownType(TypedDict):
     MISSES: defaultdict[str, defaultdict[str, defaultdict[str, defaultdict[str, int]]]]
 
 
+class BreakdownIdsType(TypedDict):
+    '''BreakdownType with source id, target id and spell id keys, ids are from events GUIDS table'''
+    ACTUAL: defaultdict[int, defaultdict[int, defaultdict[int, int]]]
+    HITS: defaultdict[int, defaultdict[int, defaultdict[int, defaultdict[str, list[int]]]]]
+    OTHER: defaultdict[int, defaultdict[int, defaultdict[int, defaultdict[str, int]]]]
+    MISSES: defaultdict[int, defaultdict[int, defaultdict[int, defaultdict[str, int]]]]
+
+
 class BreakdownTypeExtended(BreakdownType):
     SPELLS: dict[str, dict[str, str]]
     TARGETS: set[str]
@@ -117,104 +128,144 @@ def default_dict() -> BreakdownType:
         "MISSES": misses,
     }
 
+def group_keys(events: EventsColumns, rows: numpy.ndarray):
+    '''rows grouped by source, target, spell and (source id, target id, spell id) of every group'''
+    source = events["source"][rows]
+    target = events["target"][rows]
+    spell = events["spell"][rows]
+    groups, first = group_rows(source, target, spell)
+    keys = list(zip(source[first].tolist(), target[first].tolist(), spell[first].tolist()))
+    return groups, keys
+
+def add_totals(data: dict, keys: list[tuple[int, int, int]], groups: numpy.ndarray, values: numpy.ndarray):
+    '''data[source][target][spell] += sum of group values'''
+    totals = numpy.bincount(groups, weights=values, minlength=len(keys))
+    for (source_id, target_id, spell_id), total in zip(keys, totals.tolist()):
+        data[source_id][target_id][spell_id] += int(total)
+
+def add_typed(data: dict, keys: list[tuple[int, int, int]], groups: numpy.ndarray, parts: list[tuple[str, numpy.ndarray, numpy.ndarray]]):
+    '''data[source][target][spell][type] += sum of values of rows in mask.
+    parts - (type, mask, values), keys are added in order of their first row.'''
+    n = len(parts)
+    rows = numpy.arange(len(groups))
+    group_type = numpy.concatenate([groups[mask] * n + i for i, (_, mask, _) in enumerate(parts)])
+    order = numpy.concatenate([rows[mask] * n + i for i, (_, mask, _) in enumerate(parts)])
+    values = numpy.concatenate([values[mask] for _, mask, values in parts])
+    if not len(group_type):
+        return
+
+    sort = numpy.argsort(order, kind="stable")
+    unique, first, inverse = numpy.unique(group_type[sort], return_index=True, return_inverse=True)
+    totals = numpy.bincount(inverse, weights=values[sort])
+    for i in numpy.argsort(first).tolist():
+        group, type_i = divmod(int(unique[i]), n)
+        source_id, target_id, spell_id = keys[group]
+        data[source_id][target_id][spell_id][parts[type_i][0]] += int(totals[i])
+
+def add_hits(hits: dict, keys: list[tuple[int, int, int]], groups: numpy.ndarray, hit_type: numpy.ndarray, values: numpy.ndarray):
+    group_type = groups * len(HIT_TYPE) + hit_type
+    sort = numpy.argsort(group_type, kind="stable")
+    unique, first = numpy.unique(group_type[sort], return_index=True)
+    values = numpy.split(values[sort], first[1:])
+    for i in numpy.argsort(sort[first]).tolist():
+        group, type_i = divmod(int(unique[i]), len(HIT_TYPE))
+        source_id, target_id, spell_id = keys[group]
+        hits[source_id][target_id][spell_id][HIT_TYPE[type_i]].extend(values[i].tolist())
+
+def get_hit_type(events: EventsColumns, rows: numpy.ndarray):
+    is_periodic = numpy.isin(events["flag"][rows], events.flag_ids(PERIODIC.__contains__))
+    return is_periodic * 2 + (events["critical"][rows] == 1)
+
+def get_column(events: EventsColumns, rows: numpy.ndarray, column: str):
+    return events[column][rows].astype(numpy.int64)
+
 @running_time
-def _damage(logs_slice: list[str]) -> BreakdownType:
+def _damage(events: EventsColumns) -> BreakdownIdsType:
     d = default_dict()
-    actual = d["ACTUAL"]
-    hits = d["HITS"]
+    rows = numpy.flatnonzero(events.flag_mask(FLAGS_DAMAGE.__contains__))
+    if not len(rows):
+        return d
+    
+    groups, keys = group_keys(events, rows)
+    amount = get_column(events, rows, "amount")
+    overkill = get_column(events, rows, "overkill")
+    resisted = get_column(events, rows, "resisted")
+    absorbed = get_column(events, rows, "absorbed")
+    glancing = events["glancing"][rows] == 1
+    actual = amount - overkill
+
+    add_hits(d["HITS"], keys, groups, get_hit_type(events, rows), amount)
+    add_totals(d["ACTUAL"], keys, groups, actual)
+
     other = d["OTHER"]
-    misses = d["MISSES"]
-
-    for line in logs_slice:
-        if "DAMAGE" not in line:
-            continue
-        _, flag, etc = line.split(',', 2)
-        if flag not in FLAGS_DAMAGE:
-            continue
-        
-        sGUID, _, tGUID, _, spell_id, _, _, dmg, over, _, res, _, absrb, crit, glanc, _ = etc.split(',', 15)
-        _value = int(dmg)
-        
-        _hit_type = (flag in PERIODIC) * 2 + (crit == "1")
-        hits[sGUID][tGUID][spell_id][HIT_TYPE[_hit_type]].append(_value)
-        
-        _other = other[sGUID][tGUID][spell_id]
-        
-        if over != "0":
-            _over = int(over)
-            _value = _value - _over
-            _other["OVERKILL"] += _over
-        actual[sGUID][tGUID][spell_id] += _value
-
-        if res != "0":
-            _other["RESISTED"] += int(res)
-        if absrb != "0":
-            _other["ABSORBED"] += int(absrb)
-        if glanc == "1":
-            _other["GLANCED"] += int(_value/3)
-            misses[sGUID][tGUID][spell_id]["GLANCING"] += 1
+    for source_id, target_id, spell_id in keys:
+        other[source_id][target_id][spell_id]
+    add_typed(other, keys, groups, [
+        ("OVERKILL", overkill != 0, overkill),
+        ("RESISTED", resisted != 0, resisted),
+        ("ABSORBED", absorbed != 0, absorbed),
+        ("GLANCED", glancing, (actual / 3).astype(numpy.int64)),
+    ])
+    add_typed(d["MISSES"], keys, groups, [
+        ("GLANCING", glancing, numpy.ones(len(rows), dtype=numpy.int64)),
+    ])
 
     return d
         
 
 @running_time
-def _heal(logs_slice: list[str]) -> BreakdownType:
+def _heal(events: EventsColumns) -> BreakdownIdsType:
     d = default_dict()
-    actual = d["ACTUAL"]
-    hits = d["HITS"]
-    other = d["OTHER"]
+    rows = numpy.flatnonzero(events.flag_mask(lambda flag: "_HEAL" in flag))
+    if not len(rows):
+        return d
     
-    for line in logs_slice:
-        if "_HEAL" not in line:
-            continue
-        
-        _, flag, sGUID, _, tGUID, _, spell_id, _, _, heal, over, _, crit = line.split(',', 12)
-        _value = int(heal)
+    groups, keys = group_keys(events, rows)
+    amount = get_column(events, rows, "amount")
+    overheal = get_column(events, rows, "overkill")
 
-        _hit_type = (flag in PERIODIC) * 2 + (crit == "1")
-        hits[sGUID][tGUID][spell_id][HIT_TYPE[_hit_type]].append(_value)
-        
-        if over != "0":
-            _over = int(over)
-            _value = _value - _over
-            other[sGUID][tGUID][spell_id]["OVERHEAL"] += _over
-        actual[sGUID][tGUID][spell_id] += _value
+    add_hits(d["HITS"], keys, groups, get_hit_type(events, rows), amount)
+    add_totals(d["ACTUAL"], keys, groups, amount - overheal)
+    add_typed(d["OTHER"], keys, groups, [
+        ("OVERHEAL", overheal != 0, overheal),
+    ])
 
     return d
 
 @running_time
-def _cast(logs_slice: list[str]):
+def _cast(events: EventsColumns):
     casts = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    rows = numpy.flatnonzero(events.flag_mask(lambda flag: "_CAST" in flag))
+    if not len(rows):
+        return casts
     
-    for line in logs_slice:
-        if "_CAST" not in line:
-            continue
-        
-        _, _, sGUID, _, tGUID, _, spell_id, _ = line.split(',', 7)
-
-        casts[sGUID][tGUID][spell_id] += 1
-
+    groups, keys = group_keys(events, rows)
+    add_totals(casts, keys, groups, None)
     return casts
 
 @running_time
-def _miss(logs_slice: list[str]) -> BreakdownType:
+def _miss(events: EventsColumns) -> BreakdownIdsType:
     d = default_dict()
-    other = d["OTHER"]
-    misses = d["MISSES"]
+    rows = numpy.flatnonzero(events.flag_mask(lambda flag: "_MISSED" in flag))
+    if not len(rows):
+        return d
     
-    for line in logs_slice:
-        if "_MISSED" not in line:
-            continue
-        
-        _, _, sGUID, _, tGUID, _, spell_id, *more = line.split(',')
-        try:
-            v = int(more[-1])
-            type = more[-2]
-            _type = f"{type}ED"
-            other[sGUID][tGUID][spell_id][_type] += v
-        except ValueError:
-            type = more[-1]
-        misses[sGUID][tGUID][spell_id][type] += 1
+    groups, keys = group_keys(events, rows)
+    miss = events["miss"][rows]
+    amount = get_column(events, rows, "amount")
+    has_amount = events["has_amount"][rows] != 0
+    ones = numpy.ones(len(rows), dtype=numpy.int64)
+    miss_ids = numpy.unique(miss).tolist()
+    miss_types = events.MISSES
+
+    add_typed(d["OTHER"], keys, groups, [
+        (f"{miss_types[miss_id]}ED", (miss == miss_id) & has_amount, amount)
+        for miss_id in miss_ids
+    ])
+    add_typed(d["MISSES"], keys, groups, [
+        (miss_types[miss_id], miss == miss_id, ones)
+        for miss_id in miss_ids
+    ])
 
     return d
 
@@ -258,22 +309,18 @@ class SourceNumbers(logs_base.THE_LOGS):
                 return f"{spell_id}--{source_id}"
         return spell_id
     
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def numbers_damage(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        return _damage(logs_slice)
-    @logs_base.cache_wrap
+        return _damage(self.EVENTS.slice(s, f))
+    @logs_base.disk_cache_wrap
     def numbers_heal(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        return _heal(logs_slice)
-    @logs_base.cache_wrap
+        return _heal(self.EVENTS.slice(s, f))
+    @logs_base.disk_cache_wrap
     def numbers_cast(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        return _cast(logs_slice)
-    @logs_base.cache_wrap
+        return _cast(self.EVENTS.slice(s, f))
+    @logs_base.disk_cache_wrap
     def numbers_miss(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        return _miss(logs_slice)
+        return _miss(self.EVENTS.slice(s, f))
 
     @staticmethod
     def combine_values(data, new_data):
@@ -281,15 +328,22 @@ class SourceNumbers(logs_base.THE_LOGS):
             data[key] += value
 
     def add_other(self, data, new_data):
-        for sGUID, targets in new_data.items():
-            for tGUID, spells in targets.items():
+        guids = self.EVENTS.GUIDS
+        for source_id, targets in new_data.items():
+            sGUID = guids[source_id]
+            for target_id, spells in targets.items():
+                tGUID = guids[target_id]
                 for spell_id, v in spells.items():
-                    self.combine_values(data[sGUID][tGUID][spell_id], v)
+                    self.combine_values(data[sGUID][tGUID][str(spell_id)], v)
 
     def add_actual(self, data, new_data):
-        for sGUID, targets in new_data.items():
-            for tGUID, spells in targets.items():
-                self.combine_values(data[sGUID][tGUID], spells)
+        guids = self.EVENTS.GUIDS
+        for source_id, targets in new_data.items():
+            sGUID = guids[source_id]
+            for target_id, spells in targets.items():
+                _data = data[sGUID][guids[target_id]]
+                for spell_id, v in spells.items():
+                    _data[str(spell_id)] += v
 
     def combine_dict(self, data, new_data):
         self.add_actual(data["ACTUAL"], new_data["ACTUAL"])
@@ -429,8 +483,10 @@ class SourceNumbers(logs_base.THE_LOGS):
         d.update(self._misses(d["MISSES"]))
         return d
 
+    @logs_base.segments_cache_wrap
     @running_time
     def numbers_combined(self, segments: list[str, str], heal=False):
+        '''Combined numbers of segments, ids are converted back to GUIDs and spell ids strings.'''
         combined = default_dict()
         casts_combined = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
         combined["CASTS"] = casts_combined
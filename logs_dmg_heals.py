@@ -1,5 +1,7 @@
 from collections import defaultdict
 
+import numpy
+
 from h_other import is_player, sort_dict_by_value
 from h_debug import Loggers, running_time
 
@@ -123,6 +125,47 @@ def parse_both(logs: list[str], players_and_pets: set[str]):
         "heal_total": HEAL_TOTAL,
     }
 
+def sum_by_guid(guids: list[str], guid_ids: numpy.ndarray, values: numpy.ndarray):
+    data: defaultdict[str, int] = defaultdict(int)
+    if not len(guid_ids):
+        return data
+    
+    totals = numpy.bincount(guid_ids, weights=values, minlength=len(guids))
+    unique_ids, first_index = numpy.unique(guid_ids, return_index=True)
+    for guid_id in unique_ids[numpy.argsort(first_index)]:
+        data[guids[guid_id]] = int(totals[guid_id])
+    return data
+
+def both_events_columns(events, players_and_pets: set[str]):
+    '''category -> (mask of rows, unit id column, value column) of parse_both_events'''
+    source = events["source"]
+    target = events["target"]
+    amount = events["amount"]
+    overkill = events["overkill"]
+
+    is_damage = events.flag_mask(lambda flag: "_DAMAGE" in flag)
+    is_taken = is_damage & numpy.isin(target, events.guid_ids(players_and_pets))
+    is_damage_done = is_damage & ~is_taken
+    is_heal = events.flag_mask(lambda flag: "_H" in flag)
+    is_overheal_only = is_heal & (amount == overkill)
+    is_heal_actual = is_heal & ~is_overheal_only
+
+    return {
+        "damage": (is_damage_done, source, amount),
+        "heal": (is_heal_actual, source, amount - overkill),
+        "taken": (is_taken, target, amount),
+        "heal_total": (is_heal, source, amount),
+    }
+
+@running_time
+def parse_both_events(events, players_and_pets: set[str]):
+    '''same as parse_both, but over logs_events.EventsColumns'''
+    guids = events.GUIDS
+    return {
+        category: sum_by_guid(guids, units[mask], values[mask])
+        for category, (mask, units, values) in both_events_columns(events, players_and_pets).items()
+    }
+
 def parse_dmg_all_no_friendly(logs: list[str], players_and_pets: set[str]):
     data = defaultdict(int)
     for line in logs:
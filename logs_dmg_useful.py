@@ -527,17 +527,18 @@ def guid_to_custom_name(data: dict[str, dict]):
     }
 
 class UsefulDamage(logs_base.THE_LOGS):
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def target_damage(self, s, f):
         logs_slice = self.LOGS[s:f]
         return get_dmg(logs_slice)
     
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def target_damage_specific(self, s, f, boss_name: str):
         logs_slice = self.LOGS[s:f]
         specs = self.get_players_specs_in_segments(s, f)
         return specific_useful(logs_slice, boss_name, specs)
 
+    @logs_base.segments_cache_wrap
     def target_damage_wrap(self, segments: list, boss_name: str):
         damage = defaultdict(lambda: defaultdict(int))
         no_overkill = defaultdict(lambda: defaultdict(int))
@@ -134,7 +134,7 @@ def convert_keys_to_str(data: dict[int, int]):
 
 
 class Dps(logs_base.THE_LOGS):
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def get_dps(self, s, f, player: str):
         logs_slice = self.LOGS[s:f]
         all_guids = self.get_players_and_pets_guids()
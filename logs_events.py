@@ -0,0 +1,370 @@
+'''
+Columnar event store.
+
+Every line of LOGS_CUT is parsed once into typed numeric columns,
+1 row per line, so row index == line index.
+Each column is saved as a separate .npy file inside EVENTS directory next to LOGS_CUT
+and loaded with memory mapping, only columns that are used are read from disk.
+
+GUIDs, flags and miss types are stored as ids, tables to convert them back are in tables.json
+
+timestamp - milliseconds from the start of the year, previous line's if line is bugged
+flag      - index in FLAGS table, INVALID_FLAG if line is bugged
+source    - index in GUIDS table, -1 if line is bugged
+target    - index in GUIDS table, -1 if line is bugged
+spell     - spell id, -1 if line has no spell
+school    - spell school as int
+amount    - damage/heal/energize/missed amount
+has_amount - 1 if missed line has amount, even 0, e.g. ABSORB, RESIST
+overkill  - overkill or overheal
+damage_school - school of the damage
+resisted, blocked, absorbed
+critical, glancing - 0 or 1
+miss      - index in MISSES table, starts with MISS_TYPES, unknown types are added
+aura      - index in AURA_TYPES
+'''
+
+import array
+import os
+import shutil
+
+import numpy
+
+import logs_core
+import logs_postings
+from c_path import PathExt
+from h_datetime import to_ms_closure
+from h_debug import running_time
+
+EVENTS_VERSION = 3
+EVENTS_DIR_NAME = "EVENTS"
+EVENTS_TABLES_FILE_NAME = "tables.json"
+
+COLUMNS = {
+    "timestamp": "q",
+    "flag": "B",
+    "source": "i",
+    "target": "i",
+    "spell": "i",
+    "school": "B",
+    "amount": "i",
+    "has_amount": "B",
+    "overkill": "i",
+    "damage_school": "B",
+    "resisted": "i",
+    "blocked": "i",
+    "absorbed": "i",
+    "critical": "B",
+    "glancing": "B",
+    "miss": "H",
+    "aura": "B",
+}
+DAMAGE_COLUMNS = ("amount", "overkill", "damage_school", "resisted", "blocked", "absorbed", "critical", "glancing")
+HEAL_COLUMNS = ("amount", "overkill", "absorbed", "critical")
+MISS_TYPES = ("", "ABSORB", "BLOCK", "DEFLECT", "DODGE", "EVADE", "IMMUNE", "MISS", "PARRY", "REFLECT", "RESIST")
+AURA_TYPES = ("", "BUFF", "DEBUFF")
+AURA_TYPE_ID = {aura_type: i for i, aura_type in enumerate(AURA_TYPES)}
+FLAGS_DAMAGE_LAYOUT = {"DAMAGE_SHIELD", "DAMAGE_SPLIT"}
+# flag id 0 is reserved for lines without timestamp, flag, source or target
+INVALID_FLAG = ""
+INVALID_GUID_ID = -1
+
+
+def to_int(v: str):
+    try:
+        return int(v)
+    except ValueError:
+        return 0
+
+def is_damage_flag(flag: str):
+    return flag.endswith("_DAMAGE") or flag in FLAGS_DAMAGE_LAYOUT
+
+def is_heal_flag(flag: str):
+    return flag.endswith("_HEAL")
+
+def is_miss_flag(flag: str):
+    return flag.endswith("_MISSED")
+
+
+def group_rows(*keys: numpy.ndarray):
+    '''Groups rows by key columns.
+    Returns group of every row and first row of every group,
+    groups are numbered in order of their first row.'''
+    groups = numpy.zeros(len(keys[0]), dtype=numpy.int64)
+    first = numpy.zeros(min(len(groups), 1), dtype=numpy.int64)
+    for key in keys:
+        _, key_ids = numpy.unique(key, return_inverse=True)
+        combined = groups * (int(key_ids.max(initial=0)) + 1) + key_ids
+        _, first, groups = numpy.unique(combined, return_index=True, return_inverse=True)
+
+    order = numpy.argsort(first, kind="stable")
+    renumber = numpy.empty_like(order)
+    renumber[order] = numpy.arange(len(order))
+    return renumber[groups], first[order]
+
+
+class IdsTable(dict[str, int]):
+    def __init__(self, values: list[str]=None):
+        self.values = []
+        for value in values or []:
+            self[value]
+
+    def __missing__(self, key: str):
+        value = self[key] = len(self.values)
+        self.values.append(key)
+        return value
+
+
+class EventsColumns(dict[str, numpy.ndarray]):
+    def __init__(self, directory: PathExt, tables: dict[str, list[str]], parent: "EventsColumns"=None, s: int=None, f: int=None) -> None:
+        self.directory = directory
+        self.tables = tables
+        self.parent = parent
+        self.s = s
+        self.f = f
+
+    def __missing__(self, column: str):
+        if self.parent is None:
+            data = numpy.load(self.directory / f"{column}.npy", mmap_mode="r")
+        else:
+            data = self.parent[column][self.s:self.f]
+        self[column] = data
+        return data
+
+    @property
+    def FLAGS(self) -> list[str]:
+        return self.tables["flags"]
+
+    @property
+    def GUIDS(self) -> list[str]:
+        return self.tables["guids"]
+
+    @property
+    def MISSES(self) -> list[str]:
+        return self.tables["misses"]
+
+    @property
+    def GUIDS_IDS(self) -> dict[str, int]:
+        try:
+            return self.tables["guids_ids"]
+        except KeyError:
+            d = self.tables["guids_ids"] = {guid: i for i, guid in enumerate(self.GUIDS)}
+            return d
+
+    def slice(self, s: int=None, f: int=None):
+        if self.parent is not None:
+            raise ValueError("Slice only from the full events")
+        return EventsColumns(self.directory, self.tables, parent=self, s=s, f=f)
+
+    def flag_ids(self, flag_filter) -> list[int]:
+        return [
+            i
+            for i, flag in enumerate(self.FLAGS)
+            if flag != INVALID_FLAG and flag_filter(flag)
+        ]
+
+    def flag_mask(self, flag_filter) -> numpy.ndarray:
+        return numpy.isin(self["flag"], self.flag_ids(flag_filter))
+
+    def guid_ids(self, guids: set[str]) -> list[int]:
+        _ids = self.GUIDS_IDS
+        return [_ids[guid] for guid in guids if guid in _ids]
+
+
+class EventsParser:
+    def __init__(self, year: int) -> None:
+        self.to_ms = to_ms_closure(year)
+        self.last_timestamp = 0
+        self.flags = IdsTable([INVALID_FLAG])
+        self.guids = IdsTable()
+        self.misses = IdsTable(MISS_TYPES)
+        self.columns = {
+            column: array.array(typecode)
+            for column, typecode in COLUMNS.items()
+        }
+        self.appends = {
+            column: data.append
+            for column, data in self.columns.items()
+        }
+
+    def add(self, _line: list[str]):
+        row = dict.fromkeys(COLUMNS, 0)
+        row["spell"] = -1
+        try:
+            timestamp = self.to_ms(_line[0])
+            flag, source, target = _line[1], _line[2], _line[4]
+        except (IndexError, ValueError):
+            row["timestamp"] = self.last_timestamp
+            row["source"] = INVALID_GUID_ID
+            row["target"] = INVALID_GUID_ID
+            self.append_row(row)
+            return
+
+        row["timestamp"] = self.last_timestamp = timestamp
+        row["flag"] = self.flags[flag]
+        row["source"] = self.guids[source]
+        row["target"] = self.guids[target]
+        try:
+            row["spell"] = to_int(_line[6])
+            row["school"] = int(_line[8], 16)
+            etc = _line[9:]
+            if is_damage_flag(flag):
+                for column, value in zip(DAMAGE_COLUMNS, etc):
+                    row[column] = to_int(value)
+            elif is_heal_flag(flag):
+                for column, value in zip(HEAL_COLUMNS, etc):
+                    row[column] = to_int(value)
+            elif is_miss_flag(flag):
+                row["miss"] = self.misses[etc[0]]
+                if len(etc) > 1:
+                    row["amount"] = int(etc[-1])
+                    row["has_amount"] = 1
+            elif flag.startswith("SPELL_AURA"):
+                row["aura"] = AURA_TYPE_ID.get(etc[0], 0)
+            elif etc:
+                row["amount"] = to_int(etc[0])
+        except (IndexError, ValueError):
+            pass
+
+        self.append_row(row)
+
+    def append_row(self, row: dict[str, int]):
+        appends = self.appends
+        for column, value in row.items():
+            appends[column](value)
+
+    @property
+    def tables(self):
+        return {
+            "version": EVENTS_VERSION,
+            "flags": self.flags.values,
+            "guids": self.guids.values,
+            "misses": self.misses.values,
+        }
+
+
+@running_time
+def parse_events(logs: list[str], year: int):
+    parser = EventsParser(year)
+    for line in logs:
+        parser.add(line.split(','))
+    return parser.columns, parser.tables
+
+def save_events(directory: PathExt, columns: dict[str, array.array], tables: dict):
+    directory.mkdir(exist_ok=True)
+    # postings and other data built from old events are outdated
+    for derived_directory in directory.directories:
+        shutil.rmtree(derived_directory, ignore_errors=True)
+    for column, data in columns.items():
+        (directory / f"{column}.npy").npy_write(numpy.frombuffer(data, dtype=data.typecode))
+    tables_path = directory / EVENTS_TABLES_FILE_NAME
+    temp_path = tables_path.temp_path
+    temp_path.json_write(tables)
+    os.replace(temp_path, tables_path)
+
+
+class Events(logs_core.Logs):
+    @property
+    def EVENTS(self):
+        try:
+            return self.__EVENTS
+        except AttributeError:
+            self.__EVENTS = self._get_events()
+            return self.__EVENTS
+
+    @property
+    def events_directory(self):
+        return self.relative_path(EVENTS_DIR_NAME)
+
+    @property
+    def events_built(self):
+        '''EVENTS are loaded or saved, i.e. they don't need the whole LOGS to be parsed'''
+        try:
+            self.__EVENTS
+            return True
+        except AttributeError:
+            pass
+        try:
+            self.__EVENTS = self._read_events()
+            return True
+        except Exception:
+            return False
+
+    def _get_events(self):
+        try:
+            return self._read_events()
+        except Exception:
+            return self._redo_events()
+
+    def _read_events(self):
+        tables = (self.events_directory / EVENTS_TABLES_FILE_NAME).json()
+        if tables.get("version") != EVENTS_VERSION:
+            raise ValueError("Old events version")
+        return EventsColumns(self.events_directory, tables)
+
+    @running_time
+    def _redo_events(self, parser: EventsParser=None):
+        if parser is None:
+            columns, tables = parse_events(self.LOGS, self.year)
+        else:
+            columns, tables = parser.columns, parser.tables
+        save_events(self.events_directory, columns, tables)
+        return EventsColumns(self.events_directory, tables)
+
+    @property
+    def POSTINGS(self) -> dict[str, logs_postings.PostingList]:
+        try:
+            return self.__POSTINGS
+        except AttributeError:
+            self.__POSTINGS = self._get_postings()
+            return self.__POSTINGS
+
+    @property
+    def postings_directory(self):
+        return self.events_directory / logs_postings.POSTINGS_DIR_NAME
+
+    def _get_postings(self):
+        try:
+            return self._read_postings()
+        except Exception:
+            return self._redo_postings()
+
+    def _read_postings(self):
+        postings = {
+            name: logs_postings.PostingList.load(self.postings_directory, name)
+            for name in logs_postings.POSTINGS_COLUMNS
+        }
+        rows_total = len(self.EVENTS["timestamp"])
+        if any(posting_list.rows_total != rows_total for posting_list in postings.values()):
+            raise ValueError("Outdated postings, events were redone")
+        return postings
+
+    @running_time
+    def _redo_postings(self):
+        directory = self.postings_directory
+        directory.mkdir(exist_ok=True)
+        postings = {}
+        for name in logs_postings.POSTINGS_COLUMNS:
+            shift = logs_postings.KEY_SHIFT.get(name, 0)
+            postings[name] = logs_postings.PostingList.from_column(self.EVENTS[name], shift)
+            postings[name].save(directory, name)
+        return postings
+
+    def guid_lines(self, guid: str, s: int=None, f: int=None) -> numpy.ndarray:
+        '''sorted line numbers in [s, f) with guid as source or target'''
+        guid_id = self.EVENTS.GUIDS_IDS.get(guid)
+        if guid_id is None:
+            return logs_postings.EMPTY
+        as_source = self.POSTINGS["source"].lines(guid_id, s, f)
+        as_target = self.POSTINGS["target"].lines(guid_id, s, f)
+        return numpy.union1d(as_source, as_target)
+
+    def target_lines(self, guids: set[str], s: int=None, f: int=None) -> numpy.ndarray:
+        '''sorted line numbers in [s, f) with any of guids as target'''
+        postings = self.POSTINGS["target"]
+        lines = [postings.lines(guid_id, s, f) for guid_id in self.EVENTS.guid_ids(guids)]
+        return numpy.sort(numpy.concatenate([logs_postings.EMPTY, *lines]))
+
+    def spell_lines(self, spell_id: int, s: int=None, f: int=None) -> numpy.ndarray:
+        '''sorted line numbers in [s, f) with spell_id as spell'''
+        return self.POSTINGS["spell"].lines(spell_id, s, f)
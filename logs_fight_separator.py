@@ -14,6 +14,7 @@ from h_datetime import (
 )
 
 MAX_LINES = 1000
+NIL = "nil"
 MULTIBOSSES_MAIN = {
     guid: boss_guids[0]
     for boss_guids in MULTIBOSSES.values()
@@ -260,6 +261,47 @@ def split_boss_lines_to_pulls(groupped_boss_lines: dict[str, BossLines]):
         yield fight_name, start_end
 
 
+class BossLinesDump(defaultdict[str, BossLines]):
+    def __init__(self):
+        super().__init__(BossLines)
+
+    def add(self, n: int, _line: list[str]):
+        '''_line - split line, that has "xF" in it'''
+        flag = _line[1]
+        if flag not in FLAGS:
+            return
+        
+        sGUID, tGUID = _line[2], _line[4]
+        if flag == "UNIT_DIED":
+            guid_id = tGUID[6:-6]
+            if guid_id not in BOSSES_GUIDS_ALL:
+                return
+            spell_id, other = NIL, NIL
+        else:
+            spell_id = _line[6]
+            if spell_id in IGNORED_SPELL_IDS:
+                return
+            
+            guid_id = tGUID[6:-6]
+            if guid_id not in BOSSES_GUIDS_ALL:
+                if spell_id not in SOME_BOSS_SPELLS:
+                    return
+                guid_id = sGUID[6:-6]
+            other = ','.join(_line[7:])
+        
+        guid_id = MULTIBOSSES_MAIN.get(guid_id, guid_id)
+        self[guid_id].append((n, _line[0], flag, sGUID, tGUID, spell_id, other))
+
+
+def encounters_boundaries(enc_data: dict[str, list[list[int]]]):
+    return [
+        i
+        for segments in enc_data.values()
+        for segment in segments
+        for i in segment
+    ]
+
+
 class Fights(logs_core.Logs):
     @property
     def ENCOUNTER_DATA(self):
@@ -277,49 +319,24 @@ class Fights(logs_core.Logs):
             return self._redo_enc_data()
     
     def _read_enc_data(self) -> dict[str, list[list[int]]]:
-        return self.relative_path("ENCOUNTER_DATA.json").json()
+        return self._read_index_section("encounters", "ENCOUNTER_DATA.json")
 
-    def _redo_enc_data(self):
-        groupped_boss_lines = self._dump_all_boss_lines()
+    def _redo_enc_data(self, groupped_boss_lines: dict[str, BossLines]=None):
+        if groupped_boss_lines is None:
+            groupped_boss_lines = self._dump_all_boss_lines()
         enc_data = dict(split_boss_lines_to_pulls(groupped_boss_lines))
-        enc_data_file_name = self.relative_path("ENCOUNTER_DATA.json")
-        enc_data_file_name.json_write(enc_data)
+        self.INDEX.save("encounters", enc_data)
         return enc_data
 
     @running_time
-    def _dump_all_boss_lines(self):
-        NIL = "nil"
-        BOSSES: defaultdict[str, BossLines] = defaultdict(BossLines)
-        
-        for n, line in enumerate(self.LOGS):
-            if 'xF' not in line:
-                continue
-            
-            ts, flag, etc = line.split(',', 2)
-            if flag not in FLAGS:
-                continue
-            
-            if flag == "UNIT_DIED":
-                sGUID, _, tGUID, _ = etc.split(',', 3)
-                guid_id = tGUID[6:-6]
-                if guid_id not in BOSSES_GUIDS_ALL:
-                    continue
-                spell_id, other = NIL, NIL
-            else:
-                sGUID, _, tGUID, _, spell_id, other = etc.split(',', 5)
-                if spell_id in IGNORED_SPELL_IDS:
-                    continue
-                
-                guid_id = tGUID[6:-6]
-                if guid_id not in BOSSES_GUIDS_ALL:
-                    if spell_id not in SOME_BOSS_SPELLS:
-                        continue
-                    guid_id = sGUID[6:-6]
-            
-            guid_id = MULTIBOSSES_MAIN.get(guid_id, guid_id)
-            BOSSES[guid_id].append((n, ts, flag, sGUID, tGUID, spell_id, other))
-
-        return BOSSES
+    def _dump_all_boss_lines(self, logs: list[str]=None):
+        if logs is None:
+            logs = self.LOGS
+        boss_lines = BossLinesDump()
+        for n, line in enumerate(logs):
+            if 'xF' in line:
+                boss_lines.add(n, line.split(','))
+        return boss_lines
 
 
 #####################################
@@ -88,7 +88,8 @@ def _fix_ench(line: list[bytes]):
     line.extend((id, name, etc))
 
 # 3.6sec 1200mb ram
-def normalize(logs_slice: list[bytes]):
+def normalize(logs_slice: list[bytes], trailing_newline: bool=True):
+    '''trailing_newline - last line is b"", for joining with new lines'''
     _join = b','.join
     for line in logs_slice:
         if line.count(b'/') > 1:
@@ -111,7 +112,8 @@ def normalize(logs_slice: list[bytes]):
             _fix_env(_line_s)
             
         yield _join(_line_s).rstrip()
-    yield b""
+    if trailing_newline:
+        yield b""
 
 #3.75 sec 800mb ram
 def normalize_read_from_file(path):
@@ -1,7 +1,104 @@
-import logs_core
+from calendar import isleap
+
+import numpy
+
+import logs_events
+import logs_index
+from logs_core import cache_wrap
 from h_debug import running_time
 
-class Timestamps(logs_core.Logs):
+DAY_MS = 24 * 60 * 60 * 1000
+HALF_YEAR_MS = 183 * DAY_MS
+
+
+class TimestampsDump(list[int]):
+    '''index of the 1st line of every second from the start'''
+    def __init__(self, first_line: str):
+        super().__init__()
+        i = self.i = first_line.index('.')
+        self.last_minutes, self.last_seconds = int(first_line[i-5:i-3]), int(first_line[i-2:i])
+
+    def add(self, n: int, line: str):
+        i = self.i
+        try:
+            minutes, seconds = int(line[i-5:i-3]), int(line[i-2:i])
+        except ValueError:
+            # date change or bugged line 
+            i = self.i = line.index('.')
+            try:
+                minutes, seconds = int(line[i-5:i-3]), int(line[i-2:i])
+            except ValueError:
+                return
+        
+        sec_diff = seconds - self.last_seconds
+        min_diff = minutes - self.last_minutes
+
+        if min_diff:
+            if min_diff < 0:
+                min_diff += 60
+            sec_diff += min_diff * 60
+            self.last_minutes = minutes
+        
+        if sec_diff:
+            self.extend([n]*sec_diff)
+            self.last_seconds = seconds
+
+
+class Timestamps(logs_events.Events):
+    @property
+    def LINES_MS(self) -> numpy.ndarray:
+        '''milliseconds from the start of the report year for every line'''
+        try:
+            return self.__LINES_MS
+        except AttributeError:
+            self.__LINES_MS = self._new_lines_ms()
+            return self.__LINES_MS
+
+    def _new_lines_ms(self):
+        lines_ms = self.EVENTS["timestamp"]
+        if not len(lines_ms):
+            return lines_ms
+        year_changes = numpy.cumsum(numpy.diff(lines_ms, prepend=lines_ms[0]) < -HALF_YEAR_MS)
+        if not year_changes[-1]:
+            return lines_ms
+        return lines_ms + year_changes * (365 + isleap(self.year)) * DAY_MS
+
+    def get_lines_seconds(self, s: int, f: int) -> float:
+        if not self.events_built:
+            # no need to parse the whole LOGS for 2 timestamps
+            return self.get_timedelta_seconds(self.LOGS[s], self.LOGS[f])
+        return int(self.LINES_MS[f] - self.LINES_MS[s]) / 1000
+
+    def find_line_after(self, from_index: int, seconds: float) -> int:
+        '''1st line that is more than seconds after from_index line'''
+        if not self.events_built:
+            return self._find_line_after_parsed(from_index, seconds)
+        _ms = self.LINES_MS[from_index] + round(seconds * 1000)
+        return int(numpy.searchsorted(self.LINES_MS, _ms, side="right"))
+
+    def _find_line_after_parsed(self, from_index: int, seconds: float) -> int:
+        first_line = self.LOGS[from_index]
+        shifted_index = int(seconds + self.get_lines_seconds(0, from_index))
+        s = self.TIMESTAMPS[shifted_index-1]
+        f = self.TIMESTAMPS[shifted_index+1]
+        for i, current_line in enumerate(self.LOGS[s:f]):
+            if self.get_timedelta_seconds(first_line, current_line) > seconds:
+                return s+i
+        return self.TIMESTAMPS[shifted_index]
+
+    @cache_wrap
+    def get_slice_duration(self, s: int=None, f: int=None):
+        if s is None:
+            s = 0
+        if f is None:
+            f = 0
+        if f <= 0:
+            f += len(self.LOGS)
+        return self.get_lines_seconds(s, f-1)
+
+    def get_fight_duration_total(self, segments):
+        return sum(self.get_slice_duration(s, f) for s, f in segments)
+
     @property
     def TIMESTAMPS(self):
         try:
@@ -18,43 +115,20 @@ class Timestamps(logs_core.Logs):
     
     # @running_time
     def _read_timestamps(self):
-        timestamp_data_file_name = self.relative_path("TIMESTAMP_DATA.json")
-        return timestamp_data_file_name.json()
+        try:
+            return self.INDEX["timestamps"].tolist()
+        except KeyError:
+            return self.relative_path("TIMESTAMP_DATA.json").json()
     
     @running_time
-    def _redo_timestamps(self):
-        timestamps = self._new_timestamps()
-        timestamp_data_file_name = self.relative_path("TIMESTAMP_DATA.json")
-        timestamp_data_file_name.json_write(timestamps)
+    def _redo_timestamps(self, timestamps: list[int]=None):
+        if timestamps is None:
+            timestamps = self._new_timestamps()
+        self.INDEX.save("timestamps", timestamps, logs_index.KIND_INT64)
         return timestamps
     
     def _new_timestamps(self):
-        times: list[int] = []
-        first_line = self.LOGS[0]
-        i = first_line.index('.')
-        last_minutes, last_seconds = int(first_line[i-5:i-3]), int(first_line[i-2:i])
+        timestamps = TimestampsDump(self.LOGS[0])
         for n, line in enumerate(self.LOGS):
-            try:
-                minutes, seconds = int(line[i-5:i-3]), int(line[i-2:i])
-            except ValueError:
-                # date change or bugged line 
-                i = line.index('.')
-                try:
-                    minutes, seconds = int(line[i-5:i-3]), int(line[i-2:i])
-                except ValueError:
-                    continue
-            
-            sec_diff = seconds - last_seconds
-            min_diff = minutes - last_minutes
-
-            if min_diff:
-                if min_diff < 0:
-                    min_diff += 60
-                sec_diff += min_diff * 60
-                last_minutes = minutes
-            
-            if sec_diff:
-                times.extend([n]*sec_diff)
-                last_seconds = seconds
-            
-        return times
+            timestamps.add(n, line)
+        return timestamps
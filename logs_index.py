@@ -0,0 +1,116 @@
+'''
+Report index - single binary file with all report metadata.
+
+header:  magic, version, number of sections
+table:   name, kind, offset, size for every section
+data:    sections data
+
+Sections are decoded only when accessed.
+Missing section rereads the file if another process saved it since.
+'''
+
+import fcntl
+import json
+import os
+import pickle
+import struct
+
+import numpy
+import zstd
+
+from c_path import PathExt
+
+INDEX_MAGIC = b"UWUIDX"
+INDEX_VERSION = 1
+HEADER = struct.Struct("<6sHI")
+SECTION = struct.Struct("<16sBQQ")
+SECTION_NAME_MAX = 16
+
+KIND_INT64 = 0
+KIND_JSON = 1
+KIND_PICKLE = 2
+LOCK_SUFFIX = ".lock"
+
+
+def encode_section(kind: int, value) -> bytes:
+    if kind == KIND_INT64:
+        return numpy.asarray(value, dtype="<i8").tobytes()
+    if kind == KIND_PICKLE:
+        return zstd.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), 3)
+    j = json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=sorted)
+    return zstd.compress(j.encode(), 3)
+
+def decode_section(kind: int, data: bytes):
+    if kind == KIND_INT64:
+        return numpy.frombuffer(data, dtype="<i8")
+    if kind == KIND_PICKLE:
+        return pickle.loads(zstd.decompress(data))
+    return json.loads(zstd.decompress(data))
+
+def index_mtime(path: PathExt):
+    try:
+        return path.mtime
+    except OSError:
+        return None
+
+def read_sections(path: PathExt) -> dict[str, tuple[int, bytes]]:
+    try:
+        data = path.read_bytes()
+        magic, version, count = HEADER.unpack_from(data)
+    except (FileNotFoundError, struct.error):
+        return {}
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        return {}
+
+    sections = {}
+    for i in range(count):
+        name, kind, offset, size = SECTION.unpack_from(data, HEADER.size + i * SECTION.size)
+        sections[name.rstrip(b"\0").decode()] = (kind, data[offset:offset+size])
+    return sections
+
+def write_sections(path: PathExt, sections: dict[str, tuple[int, bytes]]):
+    offset = HEADER.size + len(sections) * SECTION.size
+    table = [HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(sections))]
+    for name, (kind, data) in sections.items():
+        table.append(SECTION.pack(name.encode(), kind, offset, len(data)))
+        offset += len(data)
+
+    temp_path = path.temp_path
+    with open(temp_path, "wb") as f:
+        f.writelines(table)
+        f.writelines(data for _, data in sections.values())
+    os.replace(temp_path, path)
+
+
+class ReportIndex(dict):
+    def __init__(self, path: PathExt) -> None:
+        self.path = path
+        self.reread()
+
+    def reread(self):
+        # mtime before read, file saved in between is reread again later
+        self.mtime = index_mtime(self.path)
+        self.sections = read_sections(self.path)
+
+    def __missing__(self, name: str):
+        if name not in self.sections and index_mtime(self.path) != self.mtime:
+            self.reread()
+        kind, data = self.sections[name]
+        value = self[name] = decode_section(kind, data)
+        return value
+
+    @property
+    def lock_path(self):
+        return self.path.with_name(f"{self.path.name}{LOCK_SUFFIX}")
+
+    def save(self, name: str, value, kind: int=KIND_JSON):
+        assert len(name.encode()) <= SECTION_NAME_MAX, name
+        section = (kind, encode_section(kind, value))
+        # locked reread, other processes and threads might be adding sections
+        with open(self.lock_path, "wb") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.reread()
+            self.sections[name] = section
+            write_sections(self.path, self.sections)
+            self.mtime = index_mtime(self.path)
+        self[name] = value
@@ -0,0 +1,275 @@
+'''
+Lazy access to the lines of LOGS_CUT.
+
+Decompressed logs are written once into the cache directory and memory mapped.
+Only line offsets are kept in memory, lines are decoded when they are accessed.
+Cache directory is in shared memory if possible,
+so all server workers use the same decompressed logs.
+Cache size is capped, least recently opened logs are removed to fit a new one.
+
+If LOGS_CUT has frames index and shared cache is not used,
+only frames with requested lines are decompressed, last used frames are kept in memory.
+
+LOGS[s:f] is a LinesView - no list is made, lines are decoded in chunks while iterated.
+'''
+
+import mmap
+import os
+import time
+from collections.abc import Sequence
+
+import numpy
+import zstd
+
+import h_zstd_frames
+from c_path import Directories, PathExt
+
+NEW_LINE = ord("\n")
+OFFSETS_CHUNK_BYTES = 2**26
+ITER_CHUNK_LINES = 10_000
+FRAMES_KEEP = 16
+SHARED_MEMORY_DIR = PathExt("/dev/shm")
+SHARED_CACHE_DIR_NAME = "uwu-logs"
+# shared memory is RAM, least recently opened logs are removed above it
+SHARED_CACHE_MAX_BYTES = 8 * 2**30
+
+
+def get_lines_offsets(buffer) -> numpy.ndarray:
+    '''Start of every line + end of the last line, ends include new line character.'''
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    offsets = [numpy.zeros(1, dtype=numpy.int64)]
+    for s in range(0, len(data), OFFSETS_CHUNK_BYTES):
+        new_lines = numpy.flatnonzero(data[s:s+OFFSETS_CHUNK_BYTES] == NEW_LINE)
+        offsets.append(new_lines.astype(numpy.int64) + s + 1)
+    if len(data) and data[-1] != NEW_LINE:
+        offsets.append(numpy.array([len(data) + 1], dtype=numpy.int64))
+    return numpy.concatenate(offsets)
+
+
+class LinesView(Sequence):
+    '''Lines [s, f) of LogsLines or FramesLines without copying.'''
+    __slots__ = "lines", "s", "f"
+
+    def __init__(self, lines: "LogsLines | FramesLines", s: int, f: int) -> None:
+        self.lines = lines
+        self.s = s
+        self.f = max(f, s)
+
+    def __len__(self):
+        return self.f - self.s
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            s, f, step = index.indices(len(self))
+            if step == 1:
+                return LinesView(self.lines, self.s + s, self.s + f)
+            return [self.lines[self.s + i] for i in range(s, f, step)]
+
+        _len = len(self)
+        if index < 0:
+            index += _len
+        if not 0 <= index < _len:
+            raise IndexError("LinesView index out of range")
+        return self.lines[self.s + index]
+
+    def chunks(self, s: int, f: int):
+        for chunk_s in range(s, f, ITER_CHUNK_LINES):
+            chunk_f = min(chunk_s + ITER_CHUNK_LINES, f)
+            yield chunk_s, self.lines.decode_range(chunk_s, chunk_f)
+
+    def __iter__(self):
+        for _, chunk in self.chunks(self.s, self.f):
+            yield from chunk
+
+    def __reversed__(self):
+        for chunk_f in range(self.f, self.s, -ITER_CHUNK_LINES):
+            chunk_s = max(chunk_f - ITER_CHUNK_LINES, self.s)
+            yield from reversed(self.lines.decode_range(chunk_s, chunk_f))
+
+    def index(self, value: str, start: int=0, stop: int=None):
+        s, f, _ = slice(start, stop).indices(len(self))
+        for chunk_s, chunk in self.chunks(self.s + s, self.s + f):
+            try:
+                return chunk_s - self.s + chunk.index(value)
+            except ValueError:
+                pass
+        raise ValueError(f"{value!r} is not in LinesView")
+
+
+class LogsLines:
+    def __init__(self, buffer, offsets: numpy.ndarray=None) -> None:
+        self.buffer = buffer
+        if offsets is None:
+            offsets = get_lines_offsets(buffer) if len(buffer) else numpy.zeros(1, dtype=numpy.int64)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            s, f, step = index.indices(len(self))
+            if step == 1:
+                return LinesView(self, s, f)
+            return [self.decode_line(i) for i in range(s, f, step)]
+
+        _len = len(self)
+        if index < 0:
+            index += _len
+        if not 0 <= index < _len:
+            raise IndexError("LogsLines index out of range")
+        return self.decode_line(index)
+
+    def __iter__(self):
+        return iter(LinesView(self, 0, len(self)))
+
+    def __reversed__(self):
+        return reversed(LinesView(self, 0, len(self)))
+
+    def decode_line(self, i: int) -> str:
+        return self.buffer[int(self.offsets[i]):int(self.offsets[i+1])-1].decode()
+
+    def decode_range(self, s: int, f: int) -> list[str]:
+        if s >= f:
+            return []
+        return self.buffer[int(self.offsets[s]):int(self.offsets[f])-1].decode().split("\n")
+
+    @property
+    def nbytes(self):
+        '''memory of this process, memory mapped file is shared and isn't counted'''
+        if isinstance(self.buffer, mmap.mmap):
+            return self.offsets.nbytes
+        return len(self.buffer) + self.offsets.nbytes
+
+
+class FramesLines:
+    def __init__(self, path: PathExt, index: dict[str, list[int]]) -> None:
+        self.index = index
+        self.index_lines = index["lines"]
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.frames: dict[int, LogsLines] = {}
+
+    def __len__(self):
+        return self.index_lines[-1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            s, f, step = index.indices(len(self))
+            if step == 1:
+                return LinesView(self, s, f)
+            return [self[i] for i in range(s, f, step)]
+
+        _len = len(self)
+        if index < 0:
+            index += _len
+        if not 0 <= index < _len:
+            raise IndexError("FramesLines index out of range")
+        frame_n = h_zstd_frames.frames_in_range(self.index_lines, index, index+1)[0]
+        return self.frame(frame_n).decode_line(index - self.index_lines[frame_n])
+
+    def __iter__(self):
+        for frame_n in range(len(self.index_lines) - 1):
+            yield from self.frame(frame_n)
+
+    def __reversed__(self):
+        return reversed(LinesView(self, 0, len(self)))
+
+    def frame(self, frame_n: int) -> LogsLines:
+        try:
+            lines = self.frames.pop(frame_n)
+        except KeyError:
+            lines = LogsLines(h_zstd_frames.decompress_frame(self.buffer, self.index, frame_n))
+            if len(self.frames) >= FRAMES_KEEP:
+                del self.frames[next(iter(self.frames))]
+        self.frames[frame_n] = lines
+        return lines
+
+    def decode_range(self, s: int, f: int) -> list[str]:
+        lines = []
+        for frame_n in h_zstd_frames.frames_in_range(self.index_lines, s, f):
+            frame_s = self.index_lines[frame_n]
+            lines.extend(self.frame(frame_n).decode_range(max(s - frame_s, 0), min(f, self.index_lines[frame_n+1]) - frame_s))
+        return lines
+
+    @property
+    def nbytes(self):
+        '''decompressed frames, compressed file is memory mapped'''
+        return sum(frame.nbytes for frame in list(self.frames.values()))
+
+
+def cache_directory():
+    if not SHARED_MEMORY_DIR.is_dir():
+        return Directories.cache
+    try:
+        return SHARED_MEMORY_DIR.new_child(SHARED_CACHE_DIR_NAME)
+    except OSError:
+        return Directories.cache
+
+def cache_path(report_id: str):
+    return cache_directory() / f"{report_id}.txt"
+
+def cache_is_fresh(path: PathExt, logs_path: PathExt):
+    try:
+        return path.mtime >= logs_path.mtime
+    except FileNotFoundError:
+        return False
+
+def write_cache(path: PathExt, data: bytes):
+    temp_path = path.temp_path
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+def open_lines(logs_path: PathExt, report_id: str, shared: bool=True):
+    '''shared - use decompressed logs cache, instead of decompressing frames in this process'''
+    path = cache_path(report_id)
+    if cache_is_fresh(path, logs_path):
+        os.utime(path)
+    else:
+        if not shared:
+            try:
+                return FramesLines(logs_path, h_zstd_frames.read_frames_index(logs_path))
+            except ValueError:
+                pass
+        data = zstd.decompress(logs_path.read_bytes())
+        remove_old_cache(max_bytes=SHARED_CACHE_MAX_BYTES - len(data))
+        write_cache(path, data)
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return LogsLines(b"")
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return LogsLines(buffer)
+
+def cached_files():
+    '''(last open, size, path) of every cached logs file, least recently opened first'''
+    files = []
+    for directory in {cache_directory(), Directories.cache}:
+        for path in directory.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort(key=lambda x: x[0])
+    return files
+
+def cache_size():
+    return sum(size for _, size, _ in cached_files())
+
+def remove_old_cache(max_age: float=None, max_bytes: int=SHARED_CACHE_MAX_BYTES):
+    '''Removes cached logs not opened for max_age seconds,
+    then least recently opened until cache fits in max_bytes.
+    Workers that have removed logs memory mapped keep them until they close them.'''
+    files = cached_files()
+    total = sum(size for _, size, _ in files)
+    oldest = None if max_age is None else time.time() - max_age
+    for mtime, size, path in files:
+        is_old = oldest is not None and mtime < oldest
+        if not is_old and total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            total -= size
+        except OSError:
+            pass
@@ -1,9 +1,11 @@
 import json
 from collections import defaultdict
 from dataclasses import dataclass
+from urllib.parse import parse_qsl
 
 import logs_base
 import logs_absorbs
+import logs_index
 import logs_spells_order
 import logs_check_difficulty
 import logs_deaths
@@ -12,6 +14,7 @@ import logs_dmg_heals
 import logs_dmg_useful
 import logs_dps
 import logs_power
+import logs_prefix_sums
 import logs_spell_info
 import logs_lady_spirits
 import logs_toc_valks
@@ -26,6 +29,7 @@ from c_bosses import (
 )
 from c_player_classes import SPECS_LIST
 from h_debug import running_time
+from logs_core import segments_cache_wrap
 from h_other import (
     add_new_numeric_data,
     convert_to_html_name,
@@ -100,6 +104,10 @@ def query_no_custom(query: str):
     return query
 
 
+def report_page_key(segments: list[tuple[int, int]], boss_name: str):
+    _segments = "_".join(f"{s}-{f}" for s, f in segments)
+    return f"{boss_name}|{_segments}"
+
 def to_int(v: str, default: int=None):
     try:
         return int(v)
@@ -151,6 +159,7 @@ class THE_LOGS(
     logs_valk_grabs.ValkGrabs,
     logs_ucm.UCM,
     logs_toc_valks.ValksTOC,
+    logs_prefix_sums.PrefixSums,
 ):
     def get_segments_data_json(self):
         _data = {
@@ -295,11 +304,8 @@ class THE_LOGS(
         return return_data
 
 
-    @logs_base.cache_wrap
     def get_slice_damage_heal(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        players_and_pets = self.get_players_and_pets_guids()
-        return logs_dmg_heals.parse_both(logs_slice, players_and_pets)
+        return self.get_slice_sums(s, f)
     
     @logs_base.cache_wrap
     def get_slice_damage_heal_absorbs(self, s, f):
@@ -397,8 +403,63 @@ class THE_LOGS(
             
         return d
 
+    @property
+    def REPORT_PAGES(self) -> dict[str, dict]:
+        '''report pages of default links saved by prewarm, read only'''
+        try:
+            return self.__REPORT_PAGES
+        except AttributeError:
+            pass
+        try:
+            saved = self.INDEX["report_pages"]
+        except KeyError:
+            # not cached, prewarm in another process might save it later
+            return {}
+        try:
+            if saved["version"] != self.slices_version:
+                raise ValueError("Outdated report pages")
+            self.__REPORT_PAGES = saved["pages"]
+        except (KeyError, TypeError, ValueError):
+            self.__REPORT_PAGES = {}
+        return self.__REPORT_PAGES
+
     @running_time
+    @segments_cache_wrap
     def get_report_page_all_wrap(self, segments: list[tuple[int, int]], boss_name: str):
+        try:
+            return self.REPORT_PAGES[report_page_key(segments, boss_name)]
+        except KeyError:
+            return self.get_report_page(segments, boss_name)
+
+    def prewarm_queries(self):
+        yield {}
+        for boss_segments in self.SEGMENTS_QUERIES:
+            yield dict(parse_qsl(boss_segments.href[1:]))
+        for segment in self.SEGMENTS_KILLS:
+            yield dict(parse_qsl(segment.href[1:]))
+
+    @running_time
+    def prewarm(self):
+        '''Saves absorbs of the whole report, report pages of default links and deaths of all segments,
+        so 1st view doesn't parse anything.'''
+        self.ABSORBS_COUNTERS
+        pages = {}
+        for args in self.prewarm_queries():
+            segments = self.parse_request(QuerySegment(**args))["SEGMENTS"]
+            boss_name = args.get("boss")
+            pages[report_page_key(segments, boss_name)] = self.get_report_page_all_wrap(segments, boss_name)
+        report_pages = {
+            "version": self.slices_version,
+            "pages": pages,
+        }
+        self.INDEX.save("report_pages", report_pages, logs_index.KIND_PICKLE)
+        self.__REPORT_PAGES = pages
+
+        for segments in self.ENCOUNTER_DATA.values():
+            for s, f in segments:
+                self.get_deaths_v2(s, f)
+
+    def get_report_page(self, segments: list[tuple[int, int]], boss_name: str):
         boss_name = BOSSES_FROM_HTML.get(boss_name, boss_name)
 
         if not boss_name or  boss_name == "all":
@@ -495,10 +556,11 @@ class THE_LOGS(
     @logs_base.cache_wrap
     def entities(self, s, f):
         _damage = self.numbers_damage(s, f)['ACTUAL']
-        guids = set()
-        for source_guid, targets_data in _damage.items():
-            guids.add(source_guid)
-            guids.update(targets_data)
+        guids_ids = set()
+        for source_id, targets_data in _damage.items():
+            guids_ids.add(source_id)
+            guids_ids.update(targets_data)
+        guids = {self.EVENTS.GUIDS[guid_id] for guid_id in guids_ids}
         _data = {
             k: []
             for k in ENTITIES_KEYS
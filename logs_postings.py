@@ -0,0 +1,65 @@
+'''
+Posting lists - sorted line numbers of every unit as source, as target and of every spell.
+Built from events columns and saved as .npy files inside POSTINGS directory next to them.
+Files are replaced, not written over, other processes might have them memory mapped.
+Lines of 1 unit or spell in [s, f) are 2 binary searches instead of reading every line of the slice.
+
+rows    - line numbers grouped by key, sorted inside each group
+offsets - lines of key k are rows[offsets[k]:offsets[k+1]]
+'''
+
+import numpy
+
+from c_path import PathExt
+
+POSTINGS_DIR_NAME = "POSTINGS"
+POSTINGS_COLUMNS = ("source", "target", "spell")
+# spell is -1 if line has no spell, source and target are -1 if line is bugged
+KEY_SHIFT = {
+    "source": 1,
+    "target": 1,
+    "spell": 1,
+}
+EMPTY = numpy.zeros(0, dtype=numpy.int64)
+
+
+class PostingList:
+    def __init__(self, rows: numpy.ndarray, offsets: numpy.ndarray, shift: int=0) -> None:
+        self.rows = rows
+        self.offsets = offsets
+        self.shift = shift
+
+    @classmethod
+    def from_column(cls, column: numpy.ndarray, shift: int=0):
+        keys = column.astype(numpy.int64) + shift
+        rows = numpy.argsort(keys, kind="stable").astype(numpy.int64)
+        offsets = numpy.zeros(int(keys.max(initial=-1)) + 2, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(keys), out=offsets[1:])
+        return cls(rows, offsets, shift)
+
+    @classmethod
+    def load(cls, directory: PathExt, name: str):
+        return cls(
+            numpy.load(directory / f"{name}.rows.npy", mmap_mode="r"),
+            numpy.load(directory / f"{name}.offsets.npy"),
+            KEY_SHIFT.get(name, 0),
+        )
+
+    def save(self, directory: PathExt, name: str):
+        # offsets are saved last, they are checked on load
+        (directory / f"{name}.rows.npy").npy_write(self.rows)
+        (directory / f"{name}.offsets.npy").npy_write(self.offsets)
+
+    @property
+    def rows_total(self):
+        return int(self.offsets[-1])
+
+    def lines(self, key: int, s: int=None, f: int=None) -> numpy.ndarray:
+        key = key + self.shift
+        if key < 0 or key >= len(self.offsets) - 1:
+            return EMPTY
+
+        rows = self.rows[self.offsets[key]:self.offsets[key+1]]
+        lo = 0 if s is None else numpy.searchsorted(rows, s)
+        hi = len(rows) if f is None else numpy.searchsorted(rows, f)
+        return numpy.asarray(rows[lo:hi])
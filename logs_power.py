@@ -44,7 +44,7 @@ def get_powers(logs: list[str]):
 
 
 class Powers(logs_base.THE_LOGS):
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def get_powers(self, s, f):
         logs_slice = self.LOGS[s:f]
         return get_powers(logs_slice)
@@ -83,6 +83,7 @@ class Powers(logs_base.THE_LOGS):
         spell_data[spell_id] = spell_info
         return spell_info
 
+    @logs_base.segments_cache_wrap
     @running_time
     def get_powers_all(self, segments):
         SPELLS: dict[str, dict] = {}
@@ -0,0 +1,76 @@
+'''
+Single pass over LOGS that builds report data together.
+Every line is split once and given to every collector:
+events columns, spells, boss lines for encounters and timestamps.
+
+ScanThrough scans lines on their way to another consumer, e.g. LOGS_CUT writer on upload,
+so lines are never held in memory together.
+
+GUIDs are parsed after, pet owners and Putricide's abominations need encounters.
+'''
+
+from dataclasses import dataclass
+
+from h_debug import running_time
+from logs_events import EventsParser
+from logs_fight_separator import BossLinesDump
+from logs_get_time import TimestampsDump
+from logs_spells_list import AllSpells
+
+
+@dataclass
+class ScannedLogs:
+    events: EventsParser
+    spells: AllSpells
+    boss_lines: BossLinesDump
+    timestamps: TimestampsDump
+
+
+def new_scanned(first_line: str, year: int):
+    return ScannedLogs(
+        events=EventsParser(year),
+        spells=AllSpells(),
+        boss_lines=BossLinesDump(),
+        timestamps=TimestampsDump(first_line),
+    )
+
+def line_scanner(scanned: ScannedLogs):
+    add_event = scanned.events.add
+    add_spell = scanned.spells.add
+    add_boss_line = scanned.boss_lines.add
+    add_timestamp = scanned.timestamps.add
+
+    def scan_line(n: int, line: str):
+        _line = line.split(',')
+        add_event(_line)
+        add_spell(_line)
+        add_timestamp(n, line)
+        if 'xF' in line:
+            add_boss_line(n, _line)
+
+    return scan_line
+
+@running_time
+def scan_logs(logs: list[str], year: int):
+    scanned = new_scanned(logs[0], year)
+    scan_line = line_scanner(scanned)
+    for n, line in enumerate(logs):
+        scan_line(n, line)
+    return scanned
+
+
+class ScanThrough:
+    def __init__(self, year: int) -> None:
+        self.year = year
+        self.scanned: ScannedLogs = None
+
+    def __call__(self, lines):
+        '''yields lines back, scanned is ready when they are exhausted'''
+        scan_line = None
+        for n, line in enumerate(lines):
+            _line = line.decode()
+            if scan_line is None:
+                self.scanned = new_scanned(_line, self.year)
+                scan_line = line_scanner(self.scanned)
+            scan_line(n, _line)
+            yield line
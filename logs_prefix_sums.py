@@ -0,0 +1,142 @@
+'''
+Prefix sums of damage, heal and taken of every unit.
+
+Values of every category are ordered by unit id and line with cumulative sums,
+so totals of all units in any slice are 2 binary searches and a subtraction per unit.
+Custom slices are different every time and would read every line of the slice otherwise.
+
+Each category is saved as .npy files inside PREFIX_SUMS directory inside EVENTS, they are removed when events are redone.
+Files are replaced, not written over, other processes might have them memory mapped.
+key  - unit id * STRIDE + line index, sorted
+sums - cumulative sum of values in keys order, starts with 0
+'''
+
+from collections import defaultdict
+
+import numpy
+
+import logs_base
+import logs_dmg_heals
+from c_path import PathExt
+from h_debug import running_time
+
+PREFIX_SUMS_DIR_NAME = "PREFIX_SUMS"
+TAKEN_UNITS_FILE_NAME = "taken_units.npy"
+CATEGORIES = ("damage", "heal", "taken", "heal_total")
+
+
+class UnitsPrefixSums:
+    def __init__(self, keys: numpy.ndarray, sums: numpy.ndarray, units: numpy.ndarray, stride: int) -> None:
+        self.keys = keys
+        self.sums = sums
+        self.units = units
+        self.stride = stride
+
+    @classmethod
+    def from_rows(cls, units: numpy.ndarray, rows: numpy.ndarray, values: numpy.ndarray, stride: int):
+        keys = units.astype(numpy.int64) * stride + rows
+        order = numpy.argsort(keys, kind="stable")
+        sums = numpy.zeros(len(keys) + 1, dtype=numpy.int64)
+        numpy.cumsum(values[order], out=sums[1:], dtype=numpy.int64)
+        return cls(keys[order], sums, numpy.unique(units).astype(numpy.int64), stride)
+
+    @classmethod
+    def load(cls, directory: PathExt, category: str, stride: int):
+        return cls(
+            numpy.load(directory / f"{category}.keys.npy", mmap_mode="r"),
+            numpy.load(directory / f"{category}.sums.npy", mmap_mode="r"),
+            numpy.load(directory / f"{category}.units.npy"),
+            stride,
+        )
+
+    def save(self, directory: PathExt, category: str):
+        (directory / f"{category}.keys.npy").npy_write(self.keys)
+        (directory / f"{category}.sums.npy").npy_write(self.sums)
+        (directory / f"{category}.units.npy").npy_write(self.units)
+
+    def totals(self, guids: list[str], s: int=None, f: int=None):
+        '''same as logs_dmg_heals.sum_by_guid of the slice, units are in order of their first line'''
+        data: defaultdict[str, int] = defaultdict(int)
+        s = 0 if s is None else max(s, 0)
+        f = self.stride - 1 if f is None else min(f, self.stride - 1)
+        if s >= f:
+            return data
+
+        units_start = self.units * self.stride
+        lo = numpy.searchsorted(self.keys, units_start + s)
+        hi = numpy.searchsorted(self.keys, units_start + f)
+        in_slice = hi > lo
+        lo = lo[in_slice]
+        hi = hi[in_slice]
+        first_rows = self.keys[lo] - units_start[in_slice]
+        totals = self.sums[hi] - self.sums[lo]
+        units = self.units[in_slice].tolist()
+        for i in numpy.argsort(first_rows, kind="stable").tolist():
+            data[guids[units[i]]] = int(totals[i])
+        return data
+
+
+class PrefixSums(logs_base.THE_LOGS):
+    @property
+    def PREFIX_SUMS(self) -> dict[str, UnitsPrefixSums]:
+        try:
+            return self.__PREFIX_SUMS
+        except AttributeError:
+            self.__PREFIX_SUMS = self._get_prefix_sums()
+            return self.__PREFIX_SUMS
+
+    @property
+    def prefix_sums_directory(self):
+        return self.events_directory / PREFIX_SUMS_DIR_NAME
+
+    @property
+    def prefix_sums_stride(self):
+        return len(self.EVENTS["timestamp"]) + 1
+
+    def _taken_units(self):
+        players_and_pets = self.get_players_and_pets_guids()
+        return numpy.array(sorted(self.EVENTS.guid_ids(players_and_pets)), dtype=numpy.int64)
+
+    def _get_prefix_sums(self):
+        try:
+            return self._read_prefix_sums()
+        except Exception:
+            return self._redo_prefix_sums()
+
+    def _read_prefix_sums(self):
+        directory = self.prefix_sums_directory
+        taken_units = numpy.load(directory / TAKEN_UNITS_FILE_NAME)
+        if not numpy.array_equal(taken_units, self._taken_units()):
+            raise ValueError("Outdated prefix sums, players were redone")
+        stride = self.prefix_sums_stride
+        return {
+            category: UnitsPrefixSums.load(directory, category, stride)
+            for category in CATEGORIES
+        }
+
+    @running_time
+    def _redo_prefix_sums(self):
+        events = self.EVENTS
+        stride = self.prefix_sums_stride
+        columns = logs_dmg_heals.both_events_columns(events, self.get_players_and_pets_guids())
+        prefix_sums = {}
+        for category, (mask, units, values) in columns.items():
+            rows = numpy.flatnonzero(mask)
+            prefix_sums[category] = UnitsPrefixSums.from_rows(units[rows], rows, values[rows], stride)
+
+        directory = self.prefix_sums_directory
+        directory.mkdir(exist_ok=True)
+        (directory / TAKEN_UNITS_FILE_NAME).unlink(missing_ok=True)
+        for category, category_sums in prefix_sums.items():
+            category_sums.save(directory, category)
+        # saved last, marks that all categories are saved
+        (directory / TAKEN_UNITS_FILE_NAME).npy_write(self._taken_units())
+        return prefix_sums
+
+    def get_slice_sums(self, s: int=None, f: int=None):
+        '''same as logs_dmg_heals.parse_both_events of the slice'''
+        guids = self.EVENTS.GUIDS
+        return {
+            category: category_sums.totals(guids, s, f)
+            for category, category_sums in self.PREFIX_SUMS.items()
+        }
@@ -1,5 +1,8 @@
 from collections import defaultdict
 
+import numpy
+
+import logs_aura_intervals
 import logs_base
 from constants import FLAG_ORDER
 from h_debug import Loggers, running_time
@@ -8,8 +11,11 @@ from h_other import (
     sort_dict_by_value,
     is_player,
 )
+from logs_aura_intervals import AuraWindow
 
 LOGGER_REPORTS = Loggers.reports
+# melee and ranged auto attacks are counted by flag
+OTHER_COUNT_SPELLS = {"1", "75"}
 
 def get_other_count(logs_slice: list[str], _filter: str):
     spells = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
@@ -465,6 +471,10 @@ AURAS_BOSS_MECHANICS = {
 
 AURAS = AURAS_EXTERNAL | AURAS_CONSUME | AURAS_BOSS_MECHANICS
 AURAS |= {spell_id: AURAS[spell_id_hm] for spell_id, spell_id_hm in MULTISPELLS_D.items()}
+AURAS_IDS = {
+    int(spell_id): int(MULTISPELLS_D.get(spell_id, spell_id))
+    for spell_id in AURAS
+}
 
 POT_GROUP = {
     "67490": "43186",
@@ -517,7 +527,7 @@ def get_potions_count(logs_slice: list[str]):
 
 
 class Consumables(logs_base.THE_LOGS):
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def potions_info(self, s, f) -> dict[str, dict[str, int]]:
         logs_slice = self.LOGS[s:f]
         return get_potions_count(logs_slice)
@@ -557,9 +567,19 @@ class Consumables(logs_base.THE_LOGS):
         }
 
 class SpellCount(logs_base.THE_LOGS):
+    def spell_count_lines(self, s, f, spell_id: int):
+        '''lines with the spell and dispel lines, dispelled spell is not in events'''
+        events = self.EVENTS.slice(s, f)
+        dispels = numpy.flatnonzero(events.flag_mask(lambda flag: "_DISPEL" in flag)) + (s or 0)
+        lines = numpy.union1d(self.spell_lines(spell_id, s, f), dispels)
+        return [self.LOGS[n] for n in lines.tolist()]
+
     @running_time
     def get_spell_count(self, s, f, spell_id_str):
-        logs_slice = self.LOGS[s:f]
+        if spell_id_str in OTHER_COUNT_SPELLS:
+            logs_slice = self.LOGS[s:f]
+        else:
+            logs_slice = self.spell_count_lines(s, f, int(spell_id_str))
         return get_spell_count(logs_slice, spell_id_str)
     
     def spell_count_all(self, segments, spell_id: str):
@@ -606,21 +626,6 @@ class SpellCount(logs_base.THE_LOGS):
             "SPELL_COLOR": SPELL.color,
         }
 
-class _TargetBuffCount(list[tuple[str, str]]):
-    pass
-
-def get_raid_buff_count(logs_slice: list[str], flag_filter='SPELL_AURA'):
-    auras = defaultdict(lambda: defaultdict(_TargetBuffCount))
-    for line in logs_slice:
-        if flag_filter not in line:
-            continue
-        timestamp, flag, _, _, target_guid, _, spell_id, _ = line.split(',', 7)
-        if spell_id in AURAS:
-            spell_id = MULTISPELLS_D.get(spell_id, spell_id)
-            auras[target_guid][spell_id].append((flag, timestamp))
-
-    return auras
-
 def get_filtered_info(data):
     return {
         spell_id: spell_info
@@ -631,47 +636,24 @@ def get_filtered_info(data):
 class _TargetAuraUptime(dict[str, tuple[int, float]]):
     pass
 
-class AuraUptime(logs_base.THE_LOGS):
-    def iter_spell(self, data: list[str, str]):
-        count = 0
-        uptime = 0.0
-        start = None
-        for flag, timestamp in data:
-            if start is None:
-                if flag == "SPELL_AURA_APPLIED":
-                    start = timestamp
-                    count += 1
-            elif flag == "SPELL_AURA_REMOVED":
-                uptime += self.get_timedelta_seconds(start, timestamp)
-                start = None
-            else:
-                count += 1
-        
-        return count, uptime
-
-    def get_auras_uptime(self, logs_slice, data: dict[str, dict[str, _TargetBuffCount]]):
-        first_line = logs_slice[0]
-        last_line = logs_slice[-1]
-        DUR = self.get_timedelta_seconds(first_line, last_line)
+class AuraUptime(logs_aura_intervals.AuraIntervals):
+    def get_auras_uptime(self, window: AuraWindow):
+        DUR = (window.slice_end - window.slice_start) / 1000
+        guids = self.EVENTS.GUIDS
 
         new_auras = defaultdict(_TargetAuraUptime)
 
-        for target_guid, spells in data.items():
-            for spell_id, spell_data in spells.items():
-                if spell_data[0][0] != "SPELL_AURA_APPLIED":
-                    spell_data.insert(0, ("SPELL_AURA_APPLIED", first_line))
-                if spell_data[-1][0] != "SPELL_AURA_REMOVED":
-                    spell_data.append(("SPELL_AURA_REMOVED", last_line))
-                count, uptime = self.iter_spell(spell_data)
-                new_auras[target_guid][spell_id] = (count, uptime/DUR)
+        counts, uptimes = window.applied_uptime()
+        groups = zip(window.units.tolist(), window.spells.tolist(), counts.tolist(), uptimes.tolist())
+        for unit_id, spell_id, count, uptime in groups:
+            new_auras[guids[unit_id]][str(spell_id)] = (count, uptime / 1000 / DUR)
         
         return new_auras
 
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def auras_info(self, s, f):
-        logs_slice = self.LOGS[s:f]
-        data = get_raid_buff_count(logs_slice)
-        return self.get_auras_uptime(logs_slice, data)
+        window = self.get_aura_window(AURAS_IDS, s, f)
+        return self.get_auras_uptime(window)
 
     def auras_info_all(self, segments, trim_non_players=True):
         auras_uptime = defaultdict(lambda: defaultdict(list))
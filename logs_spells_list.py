@@ -110,6 +110,19 @@ def spell_id_to_int(data: dict[str, Spell]):
     }
 
 
+class AllSpells(dict[str, Spell]):
+    def __init__(self):
+        super().__init__({
+            "0": Spell("0", "Unknown", "0x1"),
+            "1": Spell("1", "Melee", "0x1"),
+        })
+
+    def add(self, _line: list[str]):
+        if len(_line) < 9 or _line[6] in self:
+            return
+        self[_line[6]] = Spell(_line[6], _line[7], _line[8])
+
+
 class Spells(Logs):
     @property
     def SPELLS(self):
@@ -167,17 +180,17 @@ class Spells(Logs):
         return spells
     
     def _read_spells(self):
-        spells_data_file_name = self.relative_path("SPELLS_DATA.json")
         j: dict[str, dict[str, str]]
-        j = spells_data_file_name.json()
+        j = self._read_index_section("spells", "SPELLS_DATA.json")
         return {
             spell_id: Spell(id=spell_id, **v)
             for spell_id, v in j.items()
         }
     
     @running_time
-    def _redo_spells(self):
-        spells = self._get_all_spells()
+    def _redo_spells(self, spells: dict[str, Spell]=None):
+        if spells is None:
+            spells = self._get_all_spells()
         spell_ids = (
             spell_id
             for spell_id in spells
@@ -191,29 +204,17 @@ class Spells(Logs):
         return spells
 
     def _get_all_spells(self):
-        spells = {
-            "0": Spell("0", "Unknown", "0x1"),
-            "1": Spell("1", "Melee", "0x1"),
-        }
+        spells = AllSpells()
         for line in self.LOGS:
-            try:
-                _line = line.split(',', 7)
-                if _line[6] in spells: 
-                    continue
-                etc = _line[-1].split(',', 2)
-                spells[_line[6]] = Spell(_line[6], etc[0], etc[1])
-            except IndexError:
-                pass
-
+            spells.add(line.split(','))
         return spells
     
     def _save_spells(self, _spells: dict[str, Spell]):
-        spells_data_file_name = self.relative_path("SPELLS_DATA.json")
         j = {
             spell_id: spell.json_format()
             for spell_id, spell in _spells.items()
         }
-        spells_data_file_name.json_write(j)  
+        self.INDEX.save("spells", j)
 
 
 def _test1():
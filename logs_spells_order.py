@@ -74,10 +74,10 @@ class StartsBeforeHour(LineDeltaSeconds):
         return int((_minutes * 60 + _seconds)*1000)
 
 
-def get_delta_wrap(logs_slice, combat_start_line: str):
+def get_delta_wrap(first_line: str, last_line: str, combat_start_line: str):
     start_minutes, start_seconds = _timestamp_float(combat_start_line)
-    first_minutes, _ = _timestamp_float(logs_slice[0])
-    end_minutes, _ = _timestamp_float(logs_slice[-1])
+    first_minutes, _ = _timestamp_float(first_line)
+    end_minutes, _ = _timestamp_float(last_line)
     if first_minutes > start_minutes:
         c = EndAfterHour
     elif start_minutes > end_minutes:
@@ -87,18 +87,17 @@ def get_delta_wrap(logs_slice, combat_start_line: str):
     return c(start_minutes, start_seconds).get_delta
 
 @running_time
-def get_history(logs_slice: list[str], source_guid: str, ignored_guids: set[str], combat_start_line: str):
+def get_history(logs_lines: list[str], source_guid: str, ignored_guids: set[str], get_delta):
+    '''logs_lines - lines of the slice with source_guid'''
     flags = set()
     history = defaultdict(list)
 
-    get_delta = get_delta_wrap(logs_slice, combat_start_line)
-
     if not ignored_guids:
         ignored_guids = set()
     elif source_guid in ignored_guids:
         ignored_guids.remove(source_guid)
     
-    for line in logs_slice:
+    for line in logs_lines:
         if source_guid not in line:
             continue
         try:
@@ -118,14 +117,14 @@ def get_history(logs_slice: list[str], source_guid: str, ignored_guids: set[str]
 
 
 class Timeline(logs_base.THE_LOGS):
-    @logs_base.cache_wrap
+    @logs_base.disk_cache_wrap
     def get_spell_history(self, s: int, f: int, guid: str) -> dict[str, defaultdict[str, int]]:
         s_shifted = self.find_shifted_log_line(s, -180)
-        logs_slice = self.LOGS[s_shifted:f]
+        logs_lines = [self.LOGS[n] for n in self.guid_lines(guid, s_shifted, f).tolist()]
 
         players_and_pets = self.get_players_and_pets_guids()
-        combat_start_line = self.LOGS[s]
-        data = get_history(logs_slice, guid, players_and_pets, combat_start_line)
+        get_delta = get_delta_wrap(self.LOGS[s_shifted], self.LOGS[f-1], self.LOGS[s])
+        data = get_history(logs_lines, guid, players_and_pets, get_delta)
 
         self.spell_history_combine_spells(data["DATA"])
         
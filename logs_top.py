@@ -154,13 +154,21 @@ class Top(logs_main.THE_LOGS):
             if is_player(guid)
         ]
 
-def make_report_top_wrap(report_name, rewrite=False):
+def make_report_top_wrap(report_name, rewrite=False, prewarm=False):
     try:
         t = Top(report_name)
         t.make_report_top_wrap(rewrite=rewrite)
-        return True
     except Exception:
         LOGGER_REPORTS.exception(report_name)
+        return
+    
+    if prewarm:
+        # same report object, pages reuse slices cached by top
+        try:
+            t.prewarm()
+        except Exception:
+            LOGGER_REPORTS.exception(f"{report_name} | prewarm")
+    return True
 
 
 def _print_boss_top(boss_top: list[dict]):
@@ -30,24 +30,39 @@ SPECS_DATA_NOT_IGNORED = [
 ]
 
 
-def n_greater_than(data: numpy.ndarray, value: float):
-    return int((data > value).sum())
+PERCENTILES = {
+    "top99": 99,
+    "top95": 95,
+    "top90": 90,
+    "top75": 75,
+    "top50": 50,
+    "top10": 10,
+}
 
-def get_percentile(data, percentile):
-    if percentile == 100:
-        v = max(data)
-        n = 1
-    elif percentile == 0:
-        v = 0
-        n = len(data)
-    else:
-        v = round(numpy.percentile(data, percentile), 2)
-        n = n_greater_than(data, v)
-    
-    return {
-        "v": v,
-        "n": n,
+def n_greater_than(data_sorted: numpy.ndarray, values: numpy.ndarray):
+    return len(data_sorted) - numpy.searchsorted(data_sorted, values, side="right")
+
+def get_percentiles(data_sorted: numpy.ndarray):
+    '''all percentiles of 1 spec with 1 percentile call and 1 search, data must be sorted'''
+    values = numpy.percentile(data_sorted, list(PERCENTILES.values())).round(2)
+    counts = n_greater_than(data_sorted, values)
+
+    spec_data = {
+        "top100": {
+            "v": data_sorted[-1].item(),
+            "n": 1,
+        },
     }
+    for key, v, n in zip(PERCENTILES, values.tolist(), counts.tolist()):
+        spec_data[key] = {
+            "v": v,
+            "n": n,
+        }
+    spec_data["all"] = {
+        "v": 0,
+        "n": len(data_sorted),
+    }
+    return spec_data
 
 @running_time
 def convert_boss_data(data: dict[int, list[float]]):
@@ -58,16 +73,7 @@ def convert_boss_data(data: dict[int, list[float]]):
         if len(values) < 5:
             continue
         
-        data_s = numpy.fromiter(values, dtype=numpy.float64)
+        data_s = numpy.sort(numpy.fromiter(values, dtype=numpy.float64))
         spec_html = SPECS_DATA[spec_index]["spec_html"]
-        BOSS_DATA[spec_html] = {
-            "top100": get_percentile(data_s, 100),
-            "top99": get_percentile(data_s, 99),
-            "top95": get_percentile(data_s, 95),
-            "top90": get_percentile(data_s, 90),
-            "top75": get_percentile(data_s, 75),
-            "top50": get_percentile(data_s, 50),
-            "top10": get_percentile(data_s, 10),
-            "all": get_percentile(data_s, 0),
-        }
+        BOSS_DATA[spec_html] = get_percentiles(data_s)
     return BOSS_DATA
@@ -1,8 +1,11 @@
+import io
 import json
+import multiprocessing
 import re
 import subprocess
 import threading
 from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from os import utime
@@ -10,7 +13,10 @@ from shutil import disk_usage
 from time import perf_counter, sleep
 
 import api_7z
+from api_uploads_db import HASH_CHUNK_SIZE, UPLOADS_DB, file_hash, lines_hash, new_hash
 import h_server_fix
+import h_zstd_frames
+import logs_base
 import logs_fix
 from constants import (
     DEFAULT_SERVER_NAME,
@@ -20,17 +26,22 @@ from constants import (
 from c_bosses import convert_to_fight_name
 from c_path import Directories, PathExt
 from h_debug import Loggers, get_ms_str, running_time
-from h_datetime import to_dt_bytes_closure
+from h_datetime import to_dt_bytes_closure, to_ms_closure
 from h_other import get_report_name_info
 
 LOGGER_UPLOADS = Loggers.uploads
 
 BIG_GAP = timedelta(hours=14)
-SMALL_GAP = timedelta(minutes=3)
+BIG_GAP_MS = BIG_GAP // timedelta(milliseconds=1)
+SMALL_GAP_MS = timedelta(minutes=3) // timedelta(milliseconds=1)
 BUGGED_NAMES = {"nil", "Unknown"}
 DATE_FORMAT = "%y-%m-%d--%H-%M-%S"
 NIL_GUID = b"0x0000000000000000"
 NPCS = {b"0xF13", b"0xF15"}
+# start of the text file to find previous uploads of the same growing file
+RESUME_HEAD_SIZE = 2**16
+# slices that are being saved are kept in memory
+SLICE_WORKERS = 2
 
 ARCHIVE_ID_ERROR = "Bad archive.  Don't change extension manually, create archives from 0."
 ARCHIVE_ERROR = "Error extracting logs file.  Try to rename logs file and create archive again."
@@ -81,7 +92,9 @@ def logs_directory_exists(raid_id: str):
     return _slice_exists
 
 def is_fully_processed(raid_id: str):
-    return logs_directory_exists(raid_id) and raw_exists(raid_id)
+    if not logs_directory_exists(raid_id):
+        return False
+    return UPLOADS_DB.raid_is_known(raid_id) or raw_exists(raid_id)
 
 
 def nuke_folder_contents(directory: PathExt, suffix: str=None):
@@ -139,7 +152,11 @@ class LogsSliceInfo:
 class LogsSlice(list[bytes]):
     def __init__(self, server: str=None, year: int=None) -> None:
         self.to_dt = to_dt_bytes_closure(year)
+        self.to_ms = to_ms_closure(year)
         self.server = server if server else "Unknown"
+        # bytes in the text file before the 1st line and their hash
+        self.offset: int = None
+        self.prefix_hash = None
         self.__last_line = None
         self.__slice_info = LogsSliceInfo()
 
@@ -162,7 +179,7 @@ class LogsSlice(list[bytes]):
     @property
     def duration(self):
         try:
-            return (self.to_dt(self[-1]) - self.to_dt(self[0])).total_seconds()
+            return (self.to_ms(self[-1]) - self.to_ms(self[0])) / 1000
         except (IndexError, TypeError, ValueError):
             return 0.0
 
@@ -198,7 +215,7 @@ class LogsSlice(list[bytes]):
         for _ in range(5):
             line = self[index]
             try:
-                return self.to_dt(line)
+                return self.to_ms(line)
             except (TypeError, ValueError):
                 self.pop(index)
         
@@ -318,9 +335,11 @@ class CacheLineInt(dict[bytes, int]):
         return value
 
 class LogsSeparator:
-    def __init__(self, server: str=None, timestamp: float=None) -> None:
+    def __init__(self, server: str=None, timestamp: float=None, offset: int=0, prefix_hash=None) -> None:
+        self.offset = offset
+        self.prefix_hash = prefix_hash or new_hash()
         self.year = datetime.fromtimestamp(timestamp).year
-        self.to_dt = to_dt_bytes_closure(self.year)
+        self.to_ms = to_ms_closure(self.year)
         self.server = server if server else "Unknown"
 
         self.slice_cache: dict[str, dict] = {}
@@ -332,16 +351,16 @@ class LogsSeparator:
     def _new_slice(self):
         return LogsSlice(self.server, self.year)
 
-    def get_timedelta(self, now, before):
-        return self.to_dt(now) - self.to_dt(before)
+    def get_timedelta_ms(self, now, before):
+        return self.to_ms(now) - self.to_ms(before)
     
     def is_big_gap(self):
         if not self.last_segment:
             return True
         
-        segments_tdelta = self.get_timedelta(self.current_segment[0], self.last_segment[-1])
+        segments_tdelta = self.get_timedelta_ms(self.current_segment[0], self.last_segment[-1])
         LOGGER_UPLOADS.debug(f'is_big_gap {segments_tdelta}')
-        return segments_tdelta > BIG_GAP
+        return segments_tdelta > BIG_GAP_MS
 
     def is_different_raid(self):
         players_last = self.last_segment.info.players
@@ -365,9 +384,15 @@ class LogsSeparator:
         self.current_segment = self._new_slice()
         return segment
 
+    def _track_offset(self, lines: list[bytes]):
+        for line in lines:
+            yield line
+            self.offset += len(line)
+            self.prefix_hash.update(line)
+
     def generate_segments(self, lines: list[bytes]):
         NULL_BYTE = b'\x00'
-        for line in lines:
+        for line in self._track_offset(lines):
             try:
                 if line[-1] == NULL_BYTE:
                     continue
@@ -385,18 +410,21 @@ class LogsSeparator:
 
             if _delta > 100 or _delta < 0:
                 try:
-                    _dt_now = self.to_dt(line)
+                    _ms_now = self.to_ms(line)
                 except (TypeError, ValueError):
                     continue
                 
                 try:
-                    _dt_last = self.to_dt(last_line)
+                    _ms_last = self.to_ms(last_line)
                 except (TypeError, ValueError):
-                    _dt_last = self.current_segment.trim_invalid_lines(reverse=True)
+                    _ms_last = self.current_segment.trim_invalid_lines(reverse=True)
                 
-                if abs(_dt_now - _dt_last) > SMALL_GAP:
+                if abs(_ms_now - _ms_last) > SMALL_GAP_MS:
                     yield self.new_segment()
 
+            if not self.current_segment:
+                self.current_segment.offset = self.offset
+                self.current_segment.prefix_hash = self.prefix_hash.copy()
             self.current_segment.append(line)
             last_timestamp = timestamp
             last_line = line
@@ -405,6 +433,26 @@ class LogsSeparator:
         yield self.last_segment
 
 
+def save_slice_files(logs_slice: list[bytes], raw_path: PathExt, slice_path: PathExt, timestamp: float):
+    with open(raw_path, 'wb') as file:
+        file.writelines(logs_slice)
+    
+    utime(raw_path, (timestamp, timestamp))
+    # normalized slice is never held in memory, every pass normalizes it again
+    precompute_slice(slice_path, lambda: logs_fix.normalize(logs_slice, trailing_newline=False))
+
+def precompute_slice(slice_path: PathExt, new_lines: 'function'):
+    # LOGS_CUT is written by precompute with frames split on encounters
+    raid_id = slice_path.parent.name
+    try:
+        logs_base.THE_LOGS(raid_id, copy_from_backup=False).precompute(new_lines)
+    except Exception:
+        LOGGER_UPLOADS.exception(f"precompute_slice {raid_id}")
+    
+    # report can be parsed later on 1st view
+    if not slice_path.is_file():
+        h_zstd_frames.write_frames(slice_path, new_lines())
+
 def get_now_timestamp():
     return datetime.now().strftime(DATE_FORMAT)
 
@@ -452,6 +500,11 @@ class LogsArchiveParser(api_7z.SevenZipArchive):
         self.only_slices = only_slices
         self.keep_temp_folder = keep_temp_folder
 
+        self.pending_slices: dict[str, tuple[Future, float]] = {}
+        self.slices_hashes: dict[str, str] = {}
+        self.resume_info: dict[str, dict] = {}
+        self.file_info_path: PathExt = None
+
         self.has_duplicates = False
         self.has_error = False
         self.finished = False
@@ -480,6 +533,18 @@ class LogsArchiveParser(api_7z.SevenZipArchive):
             "slices": self.slices_json,
         }
 
+    @property
+    def archive_hash(self):
+        try:
+            return self.__archive_hash
+        except AttributeError:
+            pass
+        try:
+            self.__archive_hash = file_hash(self.archive_path)
+        except OSError:
+            self.__archive_hash = None
+        return self.__archive_hash
+
     @property
     def server(self):
         try:
@@ -574,10 +639,14 @@ class LogsArchiveParser(api_7z.SevenZipArchive):
         return None
 
     def _get_prev_info(self):
-        archive_id = self.archive_id
-        if not archive_id:
-            return {}
-        p = self._get_prev_info_file(archive_id)
+        p = None
+        if self.archive_hash:
+            p = UPLOADS_DB.archive_info_path(self.archive_hash)
+        if not p:
+            archive_id = self.archive_id
+            if not archive_id:
+                return {}
+            p = self._get_prev_info_file(archive_id)
         if not p:
             return {}
         j: dict = json.loads(p.read_text())
@@ -596,49 +665,156 @@ class LogsArchiveParser(api_7z.SevenZipArchive):
             raise FileNotFoundError("No text file present in archive")
 
         self.current_segment_pc = perf_counter()
-        for file_line in all_text_files:
-            # print(file_line)
-            lines = self.read_file_into_stdout(file_line)
-            separator = LogsSeparator(server=self.server, timestamp=file_line.timestamp)
-            for segment in separator.generate_segments(lines):
-                if not segment:
-                    continue
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=SLICE_WORKERS, mp_context=mp_context) as self.executor:
+            for file_line in all_text_files:
+                # print(file_line)
+                file_slices: list[str] = []
+                separator = LogsSeparator(server=self.server, timestamp=file_line.timestamp)
+                lines = self.read_new_lines(file_line, separator, file_slices)
+                for segment in separator.generate_segments(lines):
+                    if not segment:
+                        continue
+                    
+                    self.save_segment(segment, file_line.timestamp)
+                    self.adjust_mod_time(file_line, segment)
+                    self.current_segment_pc = perf_counter()
+                    if segment.id in self.slices:
+                        file_slices.append(segment.id)
                 
-                self.save_segment(segment, file_line.timestamp)
-                self.adjust_mod_time(file_line, segment)
-                self.current_segment_pc = perf_counter()
+                self.set_resume_info(file_line, separator, file_slices)
+            
+            self.wait_slices()
 
         self.add_logger_msg("Done slicing", pc=full_pc)
 
-    def save_raw_txt(self, logs_slice: LogsSlice, timestamp: float):
-        raid_id = logs_slice.id
-        self.change_slice_status("Saving", raid_id)
+    def read_new_lines(self, file_line: api_7z.SevenZipLine, separator: LogsSeparator, file_slices: list[str]):
+        '''Skips the start of the file that was sliced by previous upload of the same growing file.'''
+        stdout = self.open_file_stdout(file_line)
+        head = stdout.read(RESUME_HEAD_SIZE) + stdout.readline()
+        head_hash = new_hash()
+        head_hash.update(head)
+        head_hash = head_hash.hexdigest()
+        self.resume_info[file_line.file_name] = {"head": head_hash}
+
+        resume, prev_info = self._get_resume_info(head_hash)
+        if resume:
+            offset = resume["offset"]
+            prefix_hash = self._read_prefix_hash(stdout, head, offset)
+            if prefix_hash.hexdigest() == resume["hash"]:
+                self.add_logger_msg(f"Resumed from {offset:,} bytes")
+                separator.offset = offset
+                separator.prefix_hash = prefix_hash
+                self.add_prev_slices(prev_info, resume["slices"])
+                file_slices.extend(resume["slices"])
+                yield from api_7z.read_lines(io.BytesIO(head[offset:]))
+                yield from api_7z.read_lines(stdout)
+                return
+            
+            self._7z_pipe.kill()
+            self._7z_pipe.wait()
+            stdout = self.open_file_stdout(file_line)
+            head = b""
 
-        pc = perf_counter()
+        yield from api_7z.read_lines(io.BytesIO(head))
+        yield from api_7z.read_lines(stdout)
+
+    @staticmethod
+    def _read_prefix_hash(stdout, head: bytes, offset: int):
+        prefix_hash = new_hash()
+        prefix_hash.update(head[:offset])
+        left = offset - len(head)
+        while left > 0:
+            chunk = stdout.read(min(left, HASH_CHUNK_SIZE))
+            if not chunk:
+                break
+            prefix_hash.update(chunk)
+            left -= len(chunk)
+        return prefix_hash
+
+    def _get_resume_info(self, head_hash: str):
+        if self.forced:
+            return None, None
+        info_path = UPLOADS_DB.head_info_path(head_hash)
+        if not info_path:
+            return None, None
         
-        temp_slice_path = self.upload_data.directory / f"{raid_id}.txt"
-        with open(temp_slice_path, 'wb') as file:
-            file.writelines(logs_slice)
+        prev_info = info_path.json_ignore_error()
+        if prev_info.get("server") != self.server:
+            return None, None
         
-        utime(temp_slice_path, (timestamp, timestamp))
+        for resume in (prev_info.get("resume") or {}).values():
+            if resume.get("head") != head_hash:
+                continue
+            if not all(map(logs_directory_exists, resume["slices"])):
+                return None, None
+            return resume, prev_info
         
-        self.change_slice_status("Saved raw", raid_id, pc=pc)
+        return None, None
 
-    def save_zstd(self, logs_slice: LogsSlice):
-        raid_id = logs_slice.id
-        self.change_slice_status("Formatting", raid_id)
-        
-        pc = perf_counter()
+    def add_prev_slices(self, prev_info: dict, raid_ids: list[str]):
+        prev_slices = prev_info.get("slices") or {}
+        for raid_id in raid_ids:
+            slice_info = prev_slices.get(raid_id)
+            if not slice_info:
+                continue
+            self.slices[raid_id] = LogsSliceInfo(
+                players=set(slice_info.get("players") or []),
+                bosses=slice_info.get("bosses") or [],
+                duration=slice_info.get("duration") or 0.0,
+                id=raid_id,
+                status="Exists",
+                done=1,
+            )
+            self.has_duplicates = True
+        self.changed = True
+
+    def set_resume_info(self, file_line: api_7z.SevenZipLine, separator: LogsSeparator, file_slices: list[str]):
+        '''Next upload of the same file will skip everything before the last slice.'''
+        last_segment = separator.last_segment
+        if last_segment.offset is None:
+            offset, prefix_hash = separator.offset, separator.prefix_hash
+        else:
+            offset, prefix_hash = last_segment.offset, last_segment.prefix_hash
         
+        resume = self.resume_info[file_line.file_name]
+        resume["offset"] = offset
+        resume["hash"] = prefix_hash.hexdigest()
+        resume["slices"] = [
+            raid_id
+            for raid_id in dict.fromkeys(file_slices)
+            if raid_id != last_segment.id
+        ]
+
+    def submit_slice(self, logs_slice: LogsSlice, timestamp: float):
+        raid_id = logs_slice.id
+        if raid_id in self.pending_slices:
+            self.finish_slice(raid_id)
+        self.wait_slices(SLICE_WORKERS - 1)
+        self.change_slice_status("Saving", raid_id)
+
         slice_folder = Directories.logs.new_child(raid_id)
         slice_path = slice_folder / LOGS_CUT_NAME
+        raw_path = self.upload_data.directory / f"{raid_id}.txt"
+        future = self.executor.submit(save_slice_files, list(logs_slice), raw_path, slice_path, timestamp)
+        self.pending_slices[raid_id] = (future, perf_counter())
 
-        temp_slice_path = self.upload_data.directory / f"{raid_id}.txt"
-        
-        data = b'\n'.join(logs_fix.normalize_read_from_file(temp_slice_path))
-        slice_path.zstd_write(data)
+    def finish_slice(self, raid_id: str):
+        future, pc = self.pending_slices.pop(raid_id)
+        try:
+            future.result()
+            self.change_slice_status("Done", raid_id, pc=pc, slice_done=True)
+        except Exception:
+            LOGGER_UPLOADS.exception(f"save_segment {raid_id}")
+            self.change_slice_status("Error", raid_id)
+            raise
 
-        self.change_slice_status("Saved zstd", raid_id, pc=pc)
+    def wait_slices(self, max_pending: int=0):
+        for raid_id in list(self.pending_slices):
+            future, _ = self.pending_slices[raid_id]
+            if len(self.pending_slices) <= max_pending and not future.done():
+                continue
+            self.finish_slice(raid_id)
 
     def save_segment(self, logs_slice: LogsSlice, timestamp: float):
         # print(logs_slice)
@@ -650,19 +826,20 @@ class LogsArchiveParser(api_7z.SevenZipArchive):
         self.slices[raid_id] = logs_slice.info
         self.change_slice_status("Sliced", raid_id, pc=self.current_segment_pc)
 
-        if not self.forced and logs_slice.is_fully_processed():
+        slice_hash = lines_hash(logs_slice)
+        self.slices_hashes[slice_hash] = raid_id
+        if not self.forced and self.slice_is_processed(logs_slice, slice_hash):
             self.has_duplicates = True
             self.change_slice_status("Exists", raid_id, slice_done=True)
             return
     
-        try:
-            self.save_raw_txt(logs_slice, timestamp)
-            self.save_zstd(logs_slice)
-            self.change_slice_status("Done", raid_id, slice_done=True)
-        except Exception:
-            LOGGER_UPLOADS.exception(f"save_segment {raid_id}")
-            self.change_slice_status("Error", raid_id)
-            raise
+        self.submit_slice(logs_slice, timestamp)
+
+    def slice_is_processed(self, logs_slice: LogsSlice, slice_hash: str):
+        raid_id = logs_slice.id
+        if UPLOADS_DB.slice_raid_id(slice_hash) == raid_id:
+            return logs_directory_exists(raid_id)
+        return logs_slice.is_fully_processed()
 
 
 class LogsArchive(LogsArchiveParser):
@@ -722,6 +899,7 @@ class LogsArchive(LogsArchiveParser):
         self.remove_prev_uploaded()
         self.move_uploaded_archive_wrap()
         self.move_sliced_logs()
+        self.add_to_uploads_db()
         self.remove_temp_upload_folder()
 
     def release_archive_file(self):
@@ -838,6 +1016,7 @@ class LogsArchive(LogsArchiveParser):
             "timestamps": _timestamps,
             "archives": _archives,
             "slices": self.slices_json,
+            "resume": self.resume_info,
         }
         return json.dumps(file_info, indent=2)
 
@@ -848,6 +1027,24 @@ class LogsArchive(LogsArchiveParser):
         
         file_info = self.make_file_info()
         new_file_info_file.write_text(file_info)
+        self.file_info_path = new_file_info_file
+
+    def add_to_uploads_db(self):
+        if self.has_error:
+            return
+        try:
+            UPLOADS_DB.add_slices(self.slices_hashes)
+            if self.archive_hash and self.file_info_path:
+                UPLOADS_DB.add_archive(self.archive_hash, self.file_info_path)
+            heads = [
+                resume["head"]
+                for resume in self.resume_info.values()
+                if "offset" in resume
+            ]
+            if heads and self.file_info_path:
+                UPLOADS_DB.add_heads(heads, self.file_info_path)
+        except Exception:
+            LOGGER_UPLOADS.exception("add_to_uploads_db")
 
     def is_new_server(self):
         if self.server == DEFAULT_SERVER_NAME:
@@ -26,28 +26,50 @@ API_EXAMPLES = [
     },
 ]
 
-def n_greater_than(data: numpy.ndarray, value: float):
-    return int((data > value).sum())
-
-def get_percentile(data, percentile):
-    if percentile == 100:
-        dps = max(data)
-        raids = 1
-    elif percentile == 0:
-        dps = 0
-        raids = len(data)
-    else:
-        dps = numpy.percentile(data, percentile)
-        dps = round(dps, 2)
-        raids = n_greater_than(data, dps)
-    
-    return {
-        "dps": dps,
-        "raids": raids,
+PERCENTILES = {
+    "top99": 99,
+    "top95": 95,
+    "top90": 90,
+    "top75": 75,
+    "top50": 50,
+    "top10": 10,
+}
+ROW_DTYPE = numpy.dtype([("spec", numpy.int64), ("dps", numpy.float64)])
+
+def n_greater_than(data_sorted: numpy.ndarray, values: numpy.ndarray):
+    return len(data_sorted) - numpy.searchsorted(data_sorted, values, side="right")
+
+def get_percentiles(data_sorted: numpy.ndarray):
+    '''all percentiles of 1 spec with 1 percentile call and 1 search, data must be sorted'''
+    dps = numpy.percentile(data_sorted, list(PERCENTILES.values())).round(2)
+    raids = n_greater_than(data_sorted, dps)
+
+    spec_data = {
+        "top100": {
+            "dps": data_sorted[-1].item(),
+            "raids": 1,
+        },
     }
+    for key, _dps, _raids in zip(PERCENTILES, dps.tolist(), raids.tolist()):
+        spec_data[key] = {
+            "dps": _dps,
+            "raids": _raids,
+        }
+    spec_data["all"] = {
+        "dps": 0,
+        "raids": len(data_sorted),
+    }
+    return spec_data
+
+def group_by_spec(rows) -> dict[int, numpy.ndarray]:
+    '''rows - (spec, dps) sorted by spec and dps'''
+    data = numpy.array(list(rows), dtype=ROW_DTYPE)
+    specs, first = numpy.unique(data["spec"], return_index=True)
+    return dict(zip(specs.tolist(), numpy.split(data["dps"], first[1:])))
 
 @running_time
-def convert_boss_data(data: dict[int, list[float]]):
+def convert_boss_data(data: dict[int, numpy.ndarray]):
+    '''data - spec: sorted dps'''
     BOSS_DATA = {}
     for spec_index, values in data.items():
         if spec_index in IGNORED_SPECS:
@@ -55,18 +77,8 @@ def convert_boss_data(data: dict[int, list[float]]):
         if len(values) < 5:
             continue
         
-        data_s = numpy.fromiter(values, dtype=numpy.float64)
         spec_html = SPECS_LIST[spec_index].html_name
-        BOSS_DATA[spec_html] = {
-            "top100": get_percentile(data_s, 100),
-            "top99": get_percentile(data_s, 99),
-            "top95": get_percentile(data_s, 95),
-            "top90": get_percentile(data_s, 90),
-            "top75": get_percentile(data_s, 75),
-            "top50": get_percentile(data_s, 50),
-            "top10": get_percentile(data_s, 10),
-            "all": get_percentile(data_s, 0),
-        }
+        BOSS_DATA[spec_html] = get_percentiles(values)
     return BOSS_DATA
 
 
@@ -108,8 +120,16 @@ class PveStatsValidation(BaseModel):
             raise ValueError(f"[boss] value value must be from [{_list}]")
         return mode
 
+class StatsCached:
+    def __init__(self, signature: tuple, data: dict) -> None:
+        self.signature = signature
+        self.data = data
+
+
 class PveStats(TopDBCached):
-    cache: defaultdict[str, dict[str, dict[str, dict]]] = defaultdict(dict)
+    cache: defaultdict[str, dict[str, StatsCached]] = defaultdict(dict)
+    # tables that might be changed since they were cached
+    stale: defaultdict[str, set[str]] = defaultdict(set)
     cooldown = timedelta(minutes=10)
 
     def __init__(self, model: PveStatsValidation) -> None:
@@ -118,24 +138,29 @@ class PveStats(TopDBCached):
         self.table_name = self.encounter.table_name
 
     def get_data(self):
+        server_data = self.cache[self.server]
+        stale = self.stale[self.server]
         if self.db_was_updated():
-            self.cache[self.server].clear()
+            stale.update(server_data)
         
-        server_data = self.cache[self.server]
-        if self.table_name not in server_data:
-            server_data[self.table_name] = self._renew_data()
+        cached = server_data.get(self.table_name)
+        if cached is None or self.table_name in stale:
+            # only tables with new rows are renewed
+            signature = self._table_signature()
+            if cached is None or cached.signature != signature:
+                cached = server_data[self.table_name] = StatsCached(signature, self._renew_data())
+            stale.discard(self.table_name)
+
+        return cached.data
 
-        return server_data[self.table_name]
+    def _table_signature(self):
+        query = self.encounter.query_stats_signature()
+        return tuple(self.cursor.execute(query).fetchone())
 
     def _renew_data(self):
         query = self.encounter.query_stats()
         rows_generator = self.cursor.execute(query)
-
-        data = defaultdict(list)
-        for spec, dps in rows_generator:
-            data[spec].append(dps)
-
-        return convert_boss_data(data)
+        return convert_boss_data(group_by_spec(rows_generator))
 
 def _test1():
     conf = API_EXAMPLES[0]